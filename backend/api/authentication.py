@@ -0,0 +1,133 @@
+"""Аутентификация по токену с кэшем пользователя.
+
+Пользователь ищется по ключу токена сначала в LRU текущего процесса
+(если TOKEN_AUTH_LOCAL_TIMEOUT > 0), затем в общем кэше Django и только
+потом запросом Token + CustomUser. В кэше хранятся значения полей
+пользователя, кроме пароля и счетчиков, и на каждый запрос собирается
+свой экземпляр модели. Общий кэш используется, только если он
+действительно общий: LocMemCache у каждого воркера свой, и сброс записи
+в одном воркере не дошел бы до остальных.
+
+Запись сбрасывается сигналами users.signals: при удалении токена
+(token/logout), при любом сохранении пользователя (смена пароля,
+деактивация) и при его удалении. В общем кэше это действует сразу для
+всех воркеров, в LRU других воркеров запись живет не дольше
+TOKEN_AUTH_LOCAL_TIMEOUT, поэтому по умолчанию LRU выключен.
+Изменения через QuerySet.update() сигналов не вызывают.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram.cache import LocalCache, cache_is_shared
+
+User = get_user_model()
+
+CACHE_KEY = "auth_token:{}"
+
+_local = LocalCache(settings.TOKEN_AUTH_LOCAL_SIZE)
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats() -> dict:
+    """Счетчики кэша в текущем процессе: local_hits, shared_hits,
+    misses."""
+    with _stats_lock:
+        return {
+            "local_hits": _stats["local_hits"],
+            "shared_hits": _stats["shared_hits"],
+            "misses": _stats["misses"],
+        }
+
+
+# Хэш пароля в кэш не попадает, счетчики меняются через UPDATE
+# и в кэше сразу устарели бы. При обращении Django дочитает их из БД.
+EXCLUDED_FIELDS = {"password", *User.update_only_fields}
+
+
+def _user_fields() -> list[str]:
+    return [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.name not in EXCLUDED_FIELDS
+    ]
+
+
+def _dump(user) -> tuple:
+    return tuple(getattr(user, name) for name in _user_fields())
+
+
+def _load(values: tuple):
+    return User.from_db(DEFAULT_DB_ALIAS, _user_fields(), values)
+
+
+def _shared_cache_enabled() -> bool:
+    return settings.TOKEN_AUTH_CACHE_TIMEOUT > 0 and cache_is_shared()
+
+
+def forget_token(key: str) -> None:
+    """Сбрасывает пользователя токена key из обоих уровней кэша."""
+    _local.delete(key)
+    cache.delete(CACHE_KEY.format(key))
+
+
+def forget_user_tokens(user_id: int) -> None:
+    for key in Token.objects.filter(user_id=user_id).values_list(
+        "key", flat=True
+    ):
+        forget_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который не ходит в БД для известных токенов.
+    Ошибки и заголовок WWW-Authenticate те же, что у TokenAuthentication.
+    """
+
+    def authenticate_credentials(self, key):
+        values = None
+        local_timeout = settings.TOKEN_AUTH_LOCAL_TIMEOUT
+        if local_timeout > 0:
+            values = _local.get(key)
+        if values is not None:
+            _count("local_hits")
+        else:
+            shared = _shared_cache_enabled()
+            if shared:
+                values = cache.get(CACHE_KEY.format(key))
+            # Запись от версии модели с другим набором полей.
+            if values is not None and len(values) != len(_user_fields()):
+                values = None
+            if values is not None:
+                _count("shared_hits")
+            else:
+                _count("misses")
+                user, token = super().authenticate_credentials(key)
+                values = _dump(user)
+                if shared:
+                    cache.set(
+                        CACHE_KEY.format(key),
+                        values,
+                        settings.TOKEN_AUTH_CACHE_TIMEOUT,
+                    )
+            if local_timeout > 0:
+                _local.set(key, values, local_timeout)
+        user = _load(values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted.")
+            )
+        return user, Token(key=key, user=user)
@@ -0,0 +1,508 @@
+"""Нагрузочный прогон API внутри процесса.
+
+Сценарии строятся по docs/openapi-schema.yml: для каждой операции
+схемы (и для маршрутов, которых в схеме нет: редиректа
+/s/<short_code>/ и массовых операций с избранным и покупками)
+выполняются запросы анонимом и/или авторизованным пользователем,
+для списков дополнительно с каждым фильтром из схемы.
+По каждому сценарию считаются p50/p95/p99 времени ответа,
+число SQL-запросов и размер ответа в байтах.
+"""
+import itertools
+import json
+import statistics
+import time
+
+import yaml
+from django.contrib.auth import get_user_model
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, resolve
+from rest_framework.authtoken.models import Token
+
+from recipe import counters
+from recipe.models import Favorite, Ingredient, Link, Recipe, ShoppingCart, Tag
+from users.models import Subscription
+
+User = get_user_model()
+
+BENCHMARK_EMAIL = "benchmark@example.com"
+BENCHMARK_PASSWORD = "benchmark-Pa55word"
+PNG = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA"
+    "CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNo"
+    "AAAAggCByxOyYQAAAABJRU5ErkJggg=="
+)
+IGNORED_ROUTES = ("api-root",)
+IGNORED_PREFIXES = ("admin/", "__debug__/", "media/", "static/")
+
+
+class Scenario:
+    """Один повторяемый запрос.
+
+    url может быть функцией, если зависит от подготовленных данных.
+    before() вызывается перед каждым запросом вне замера,
+    after(response) - после запроса, тоже вне замера.
+    """
+
+    def __init__(
+        self, key, method, url, auth, data=None, before=None, after=None
+    ):
+        self.key = key
+        self.method = method
+        self.url = url
+        self.auth = auth
+        self.data = data
+        self.before = before
+        self.after = after
+
+
+class Fixtures:
+    """Данные, на которые ссылаются сценарии."""
+
+    def __init__(self):
+        self.user = self.get_user()
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+        recipes = Recipe.objects.exclude(author=self.user).order_by("-id")
+        self.recipe = recipes.first()
+        if self.recipe is None:
+            raise LookupError(
+                "В базе нет рецептов, сначала выполните generate_data."
+            )
+        self.toggle_recipe = recipes.exclude(
+            favorites__user=self.user
+        ).exclude(shopping_cart__user=self.user).first() or self.recipe
+        self.author = self.recipe.author
+        self.tag_slugs = list(
+            Tag.objects.order_by("id").values_list("slug", flat=True)[:2]
+        )
+        self.tag = Tag.objects.order_by("id").first()
+        self.ingredient = Ingredient.objects.order_by("id").first()
+        cart = list(recipes.exclude(pk=self.toggle_recipe.pk)[:10])
+        self.cart = cart
+        self.bulk_recipes = list(
+            recipes.exclude(pk=self.toggle_recipe.pk).exclude(
+                pk__in=[r.pk for r in cart]
+            )[:10]
+        ) or [self.toggle_recipe]
+        ShoppingCart.objects.bulk_create(
+            [ShoppingCart(user=self.user, recipe=r) for r in cart],
+            ignore_conflicts=True,
+        )
+        Favorite.objects.bulk_create(
+            [Favorite(user=self.user, recipe=r) for r in cart[:5]],
+            ignore_conflicts=True,
+        )
+        followed = set(
+            recipes.exclude(author=self.author).values_list(
+                "author_id", flat=True
+            )[:50]
+        )
+        Subscription.objects.bulk_create(
+            [
+                Subscription(user=self.user, following_id=author_id)
+                for author_id in followed
+            ],
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts не сообщает, что вставлено: счетчики
+        # затронутых строк пересчитываются.
+        for counter in counters.COUNTERS:
+            pks = (
+                [r.pk for r in cart]
+                if counter.model is Recipe
+                else [self.user.pk, *followed]
+            )
+            counters.reconcile(counter, pks=pks)
+        self.own_recipe = self.create_recipe()
+        self.registered = itertools.count()
+
+    @staticmethod
+    def get_user():
+        user, created = User.objects.get_or_create(
+            email=BENCHMARK_EMAIL,
+            defaults={
+                "username": "benchmark",
+                "first_name": "Benchmark",
+                "last_name": "User",
+            },
+        )
+        user.set_password(BENCHMARK_PASSWORD)
+        user.save()
+        return user
+
+    def create_recipe(self):
+        recipe = Recipe.objects.create(
+            author=self.user,
+            name="Benchmark",
+            text="Benchmark",
+            cooking_time=10,
+        )
+        if self.tag:
+            recipe.tags.add(self.tag)
+        if self.ingredient:
+            recipe.recipeingredient_set.create(
+                ingredient=self.ingredient, amount=10
+            )
+        return recipe
+
+    def recipe_payload(self):
+        return {
+            "name": "Benchmark",
+            "text": "Benchmark",
+            "cooking_time": 10,
+            "image": PNG,
+            "tags": [self.tag.id],
+            "ingredients": [{"id": self.ingredient.id, "amount": 10}],
+        }
+
+
+class Runner:
+    def __init__(self, schema_path, iterations=20, warmup=2):
+        with open(schema_path, encoding="utf-8") as schema_file:
+            self.schema = yaml.safe_load(schema_file)
+        self.iterations = iterations
+        self.warmup = warmup
+        self.fixtures = Fixtures()
+        self.anon = Client()
+        self.client = Client(
+            HTTP_AUTHORIZATION=f"Token {self.fixtures.token}"
+        )
+
+    def run(self, on_result=None) -> dict:
+        results = {}
+        for scenario in self.build_scenarios():
+            results[scenario.key] = self.measure(scenario)
+            if on_result:
+                on_result(scenario.key, results[scenario.key])
+        return results
+
+    def measure(self, scenario) -> dict:
+        client = self.client if scenario.auth else self.anon
+        latencies, queries, sizes, statuses = [], [], [], set()
+        for i in range(self.warmup + self.iterations):
+            if scenario.before:
+                scenario.before()
+            url = scenario.url() if callable(scenario.url) else scenario.url
+            # Каждый запрос клиента очищает журнал SQL-запросов, поэтому
+            # журнал сбрасывается до замера, а число запросов читается
+            # до after(): запросы из before() и after() не сдвигают срез.
+            reset_queries()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.generic(
+                    scenario.method,
+                    url,
+                    json.dumps(scenario.data) if scenario.data else "",
+                    content_type="application/json",
+                )
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response)
+                else:
+                    size = len(response.content)
+                elapsed = time.perf_counter() - started
+            query_count = len(context.captured_queries)
+            if scenario.after:
+                scenario.after(response)
+            if i < self.warmup:
+                continue
+            latencies.append(elapsed * 1000)
+            queries.append(query_count)
+            sizes.append(size)
+            statuses.add(response.status_code)
+        percentiles = statistics.quantiles(
+            latencies, n=100, method="inclusive"
+        )
+        return {
+            "route": resolve(url.split("?")[0]).view_name,
+            "status": sorted(statuses),
+            "p50_ms": round(percentiles[49], 3),
+            "p95_ms": round(percentiles[94], 3),
+            "p99_ms": round(percentiles[98], 3),
+            "queries": max(queries),
+            "bytes": round(statistics.mean(sizes)),
+        }
+
+    def build_scenarios(self) -> list:
+        scenarios = []
+        for path, operations in self.schema["paths"].items():
+            for method, operation in operations.items():
+                scenarios.extend(
+                    self.operation_scenarios(path, method, operation)
+                )
+        scenarios.extend(self.redirect_scenarios())
+        scenarios.extend(self.bulk_scenarios())
+        return scenarios
+
+    def operation_scenarios(self, path, method, operation):
+        url = path.replace("{id}", str(self.path_id(path)))
+        key = f"{method.upper()} {path}"
+        secured = bool(operation.get("security"))
+        if method == "get":
+            variants = [("", {})] + [
+                (f" ?{name}", {name: value})
+                for name, value in self.filter_values(operation)
+            ]
+            for suffix, params in variants:
+                query = "&".join(
+                    f"{name}={item}"
+                    for name, value in params.items()
+                    for item in (value if isinstance(value, list) else [value])
+                )
+                full_url = f"{url}?{query}" if query else url
+                if not secured:
+                    yield Scenario(f"{key}{suffix} anon", "GET", full_url, False)
+                yield Scenario(f"{key}{suffix} auth", "GET", full_url, True)
+            return
+        builder = self.write_builders().get((method, path))
+        if builder is not None:
+            yield builder(key, url)
+
+    def write_builders(self):
+        fixtures = self.fixtures
+        user = fixtures.user
+        toggle = fixtures.toggle_recipe
+
+        def relation(model):
+            def add(key, url):
+                return Scenario(
+                    key, "POST", url, True,
+                    before=lambda: model.objects.filter(
+                        user=user, recipe=toggle
+                    ).delete(),
+                )
+
+            def remove(key, url):
+                return Scenario(
+                    key, "DELETE", url, True,
+                    before=lambda: model.objects.get_or_create(
+                        user=user, recipe=toggle
+                    ),
+                )
+
+            return add, remove
+
+        favorite_add, favorite_remove = relation(Favorite)
+        cart_add, cart_remove = relation(ShoppingCart)
+
+        def subscribe(key, url):
+            return Scenario(
+                key, "POST", url, True,
+                before=lambda: Subscription.objects.filter(
+                    user=user, following=fixtures.author
+                ).delete(),
+            )
+
+        def unsubscribe(key, url):
+            return Scenario(
+                key, "DELETE", url, True,
+                before=lambda: Subscription.objects.get_or_create(
+                    user=user, following=fixtures.author
+                ),
+            )
+
+        def create_recipe(key, url):
+            return Scenario(
+                key, "POST", url, True, data=fixtures.recipe_payload(),
+                after=lambda response: Recipe.objects.filter(
+                    pk=response.json().get("id")
+                ).delete(),
+            )
+
+        def update_recipe(key, url):
+            return Scenario(
+                key, "PATCH", f"/api/recipes/{fixtures.own_recipe.id}/",
+                True, data=fixtures.recipe_payload(),
+            )
+
+        def delete_recipe(key, url):
+            return Scenario(
+                key, "DELETE",
+                lambda: f"/api/recipes/{fixtures.create_recipe().id}/",
+                True,
+            )
+
+        def register(key, url):
+            def data():
+                number = next(fixtures.registered)
+                scenario.data = {
+                    "email": f"benchmark-{number}@example.com",
+                    "username": f"benchmark-{number}",
+                    "first_name": "Benchmark",
+                    "last_name": "User",
+                    "password": BENCHMARK_PASSWORD,
+                }
+
+            scenario = Scenario(
+                key, "POST", url, False, before=data,
+                after=lambda response: User.objects.filter(
+                    email=scenario.data["email"]
+                ).delete(),
+            )
+            return scenario
+
+        def set_avatar(key, url):
+            # Во view аватар меняется методом PUT, в схеме указан PATCH.
+            return Scenario(key, "PUT", url, True, data={"avatar": PNG})
+
+        def delete_avatar(key, url):
+            return Scenario(
+                key, "DELETE", url, True,
+                before=lambda: self.client.put(
+                    url, {"avatar": PNG}, content_type="application/json"
+                ),
+            )
+
+        def set_password(key, url):
+            return Scenario(
+                key, "POST", url, True,
+                data={
+                    "current_password": BENCHMARK_PASSWORD,
+                    "new_password": BENCHMARK_PASSWORD,
+                },
+            )
+
+        def login(key, url):
+            return Scenario(
+                key, "POST", url, False,
+                data={"email": user.email, "password": BENCHMARK_PASSWORD},
+            )
+
+        def logout(key, url):
+            return Scenario(
+                key, "POST", url, True,
+                after=lambda response: Token.objects.get_or_create(
+                    key=fixtures.token, user=user
+                ),
+            )
+
+        return {
+            ("post", "/api/recipes/{id}/favorite/"): favorite_add,
+            ("delete", "/api/recipes/{id}/favorite/"): favorite_remove,
+            ("post", "/api/recipes/{id}/shopping_cart/"): cart_add,
+            ("delete", "/api/recipes/{id}/shopping_cart/"): cart_remove,
+            ("post", "/api/users/{id}/subscribe/"): subscribe,
+            ("delete", "/api/users/{id}/subscribe/"): unsubscribe,
+            ("post", "/api/recipes/"): create_recipe,
+            ("patch", "/api/recipes/{id}/"): update_recipe,
+            ("delete", "/api/recipes/{id}/"): delete_recipe,
+            ("post", "/api/users/"): register,
+            ("patch", "/api/users/me/avatar/"): set_avatar,
+            ("delete", "/api/users/me/avatar/"): delete_avatar,
+            ("post", "/api/users/set_password/"): set_password,
+            ("post", "/api/auth/token/login/"): login,
+            ("post", "/api/auth/token/logout/"): logout,
+        }
+
+    def redirect_scenarios(self):
+        link = Link.objects.order_by("id").first()
+        if link is None:
+            self.client.get(f"/api/recipes/{self.fixtures.recipe.id}/get-link/")
+            link = Link.objects.order_by("id").first()
+        yield Scenario(
+            "GET /s/{short_code}/ anon", "GET", f"/s/{link.short_code}/", False
+        )
+
+    def bulk_scenarios(self):
+        """Массовые операции: перед каждым запросом обратный запрос
+        возвращает избранное и покупки в исходное состояние."""
+        fixtures = self.fixtures
+        data = {"recipes": [r.id for r in fixtures.bulk_recipes]}
+        for name in ("favorite", "shopping_cart"):
+            url = f"/api/recipes/{name}/bulk/"
+            yield Scenario(
+                f"POST {url}", "POST", url, True, data=data,
+                before=lambda url=url: self.send("DELETE", url, data),
+            )
+            yield Scenario(
+                f"DELETE {url}", "DELETE", url, True, data=data,
+                before=lambda url=url: self.send("POST", url, data),
+            )
+        yield Scenario(
+            "DELETE /api/recipes/shopping_cart/", "DELETE",
+            "/api/recipes/shopping_cart/", True,
+            after=lambda response: self.send(
+                "POST",
+                "/api/recipes/shopping_cart/bulk/",
+                {"recipes": [r.id for r in fixtures.cart]},
+            ),
+        )
+
+    def send(self, method, url, data):
+        """Запрос авторизованным клиентом вне замера."""
+        return self.client.generic(
+            method, url, json.dumps(data), content_type="application/json"
+        )
+
+    def path_id(self, path):
+        fixtures = self.fixtures
+        if path.startswith("/api/recipes/"):
+            return (
+                fixtures.toggle_recipe.id
+                if path.endswith(("favorite/", "shopping_cart/"))
+                else fixtures.recipe.id
+            )
+        if path.startswith("/api/users/"):
+            return fixtures.author.id
+        if path.startswith("/api/tags/"):
+            return fixtures.tag.id
+        if path.startswith("/api/ingredients/"):
+            return fixtures.ingredient.id
+        return None
+
+    def filter_values(self, operation):
+        """Значения для query-параметров операции, кроме пагинации."""
+        fixtures = self.fixtures
+        samples = {
+            "is_favorited": 1,
+            "is_in_shopping_cart": 1,
+            "author": fixtures.author.id,
+            "tags": fixtures.tag_slugs,
+            "name": (fixtures.ingredient.name[:2] if fixtures.ingredient else "а"),
+            "recipes_limit": 3,
+        }
+        for parameter in operation.get("parameters", []):
+            name = parameter.get("name")
+            if parameter.get("in") == "query" and name in samples:
+                yield name, samples[name]
+
+    def uncovered_routes(self, results: dict) -> list:
+        """Имена маршрутов из urls.py, которые не попали в сценарии."""
+        covered = {result["route"] for result in results.values()}
+        return sorted(
+            name
+            for name in set(route_names(get_resolver()))
+            if name not in covered and name not in IGNORED_ROUTES
+        )
+
+
+def route_names(resolver, prefix=""):
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern)
+        if route.startswith(IGNORED_PREFIXES):
+            continue
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern, route)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_ms: float):
+    """Сравнивает прогон с базовым.
+    Регрессия - рост p95 больше чем на threshold (и не меньше min_ms)
+    или рост числа запросов.
+    """
+    rows = []
+    for key, result in current.items():
+        base = baseline.get(key)
+        if base is None:
+            rows.append((key, result, None, False))
+            continue
+        slower = (
+            result["p95_ms"] > base["p95_ms"] * (1 + threshold)
+            and result["p95_ms"] - base["p95_ms"] >= min_ms
+        )
+        regressed = slower or result["queries"] > base["queries"]
+        rows.append((key, result, base, regressed))
+    return rows
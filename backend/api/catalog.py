@@ -0,0 +1,206 @@
+"""Каталог ингредиентов в памяти процесса.
+
+Таблица ингредиентов маленькая и почти не меняется, поэтому для
+поиска при вводе она целиком держится в памяти в виде отсортированного
+по casefold() списка. Снимок перестраивается, когда меняется версия
+"ingredients" в кэше (сигналы Ingredient, import_data), и не реже
+чем раз в INGREDIENT_CATALOG_TTL секунд - на случай изменений из
+других процессов без общего кэша.
+
+Нечеткий поиск (?fuzzy=1) ранжирует результаты по триграммному
+сходству в духе pg_trgm: сначала совпадения по началу названия,
+затем по убыванию сходства. На PostgreSQL с расширением pg_trgm
+поиск выполняется в БД, иначе по триграммному индексу каталога.
+
+Полный список (GET /api/ingredients/ без фильтра) отдается готовыми
+байтами JSON и gzip, которые строятся один раз на снимок. Снимок
+пересоздается только при фактическом изменении строк, поэтому
+ETag остается прежним, пока ингредиенты не поменялись.
+"""
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils.functional import cached_property
+
+from foodgram.cache import get_version
+from recipe.models import Ingredient
+
+_catalog = None
+_lock = threading.Lock()
+_has_pg_trgm = None
+
+WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(text: str) -> set[str]:
+    """Триграммы как в pg_trgm: по словам, с двумя пробелами
+    в начале и одним в конце слова."""
+    result = set()
+    for word in WORD_RE.findall(text.casefold()):
+        padded = f"  {word} "
+        result.update(
+            padded[index:index + 3] for index in range(len(padded) - 2)
+        )
+    return result
+
+
+class IngredientCatalog:
+    def __init__(self, rows: list[dict], version: int):
+        self.rows = sorted(
+            rows, key=lambda row: (row["name"].casefold(), row["id"])
+        )
+        self.keys = [row["name"].casefold() for row in self.rows]
+        self.version = version
+        self.built = time.monotonic()
+
+    @cached_property
+    def body(self) -> bytes:
+        """Полный список в порядке id, как его отдает JSONRenderer."""
+        rows = sorted(self.rows, key=lambda row: row["id"])
+        return json.dumps(
+            rows, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+    @cached_property
+    def gzip_body(self) -> bytes:
+        return gzip.compress(self.body, compresslevel=9, mtime=0)
+
+    @cached_property
+    def etag(self) -> str:
+        return '"%s"' % hashlib.sha256(self.body).hexdigest()[:32]
+
+    def search_prefix(self, query: str, limit: int) -> list[dict]:
+        """Ингредиенты, название которых начинается с query,
+        без учета регистра, в алфавитном порядке."""
+        prefix = query.strip().casefold()
+        results = []
+        index = bisect_left(self.keys, prefix)
+        while (
+            index < len(self.keys)
+            and len(results) < limit
+            and self.keys[index].startswith(prefix)
+        ):
+            results.append(self.rows[index])
+            index += 1
+        return results
+
+    def search_fuzzy(
+        self, query: str, limit: int, threshold: float
+    ) -> list[dict]:
+        """Совпадения по началу названия, затем ингредиенты с
+        триграммным сходством не ниже threshold."""
+        index = self.trigram_index
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(index.get(trigram, ()))
+        prefix = query.strip().casefold()
+        ranked = []
+        for position, common in shared.items():
+            similarity = common / (
+                len(query_trigrams) + len(self.trigrams[position]) - common
+            )
+            is_prefix = self.keys[position].startswith(prefix)
+            if is_prefix or similarity >= threshold:
+                ranked.append((not is_prefix, -similarity, position))
+        ranked.sort()
+        return [self.rows[position] for *_, position in ranked[:limit]]
+
+    @property
+    def trigram_index(self) -> dict[str, list[int]]:
+        """Инвертированный индекс триграмма -> позиции, строится
+        при первом нечетком поиске."""
+        if not hasattr(self, "_trigram_index"):
+            self.trigrams = [trigrams(row["name"]) for row in self.rows]
+            index = {}
+            for position, row_trigrams in enumerate(self.trigrams):
+                for trigram in row_trigrams:
+                    index.setdefault(trigram, []).append(position)
+            self._trigram_index = index
+        return self._trigram_index
+
+
+def search_fuzzy(query: str, limit: int) -> list[dict]:
+    threshold = settings.INGREDIENT_FUZZY_THRESHOLD
+    if use_pg_trgm():
+        return search_fuzzy_pg(query, limit, threshold)
+    return get_catalog().search_fuzzy(query, limit, threshold)
+
+
+def use_pg_trgm() -> bool:
+    global _has_pg_trgm
+    backend = settings.INGREDIENT_FUZZY_BACKEND
+    if backend == "python" or connection.vendor != "postgresql":
+        return False
+    if _has_pg_trgm is None:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+                )
+                _has_pg_trgm = cursor.fetchone() is not None
+        except DatabaseError:
+            _has_pg_trgm = False
+    return _has_pg_trgm
+
+
+def search_fuzzy_pg(query: str, limit: int, threshold: float) -> list[dict]:
+    """Тот же поиск средствами pg_trgm. Оператор % использует
+    GIN-индекс по name, его порог pg_trgm.similarity_threshold
+    на время транзакции равен threshold, как в поиске в памяти."""
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    query = query.strip()
+    prefix = Q(name__istartswith=query)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+                [str(threshold)],
+            )
+        return list(
+            Ingredient.objects.filter(
+                Q(TrigramSimilar(F("name"), Value(query))) | prefix
+            )
+            .annotate(
+                is_prefix=Case(When(prefix, then=Value(0)), default=Value(1)),
+                similarity=TrigramSimilarity("name", query),
+            )
+            .order_by("is_prefix", "-similarity", "name")
+            .values("id", "name", "measurement_unit")[:limit]
+        )
+
+
+def get_catalog() -> IngredientCatalog:
+    global _catalog
+    version = get_version("ingredients")
+    catalog = _catalog
+    if (
+        catalog is None
+        or catalog.version != version
+        or time.monotonic() - catalog.built > settings.INGREDIENT_CATALOG_TTL
+    ):
+        with _lock:
+            if _catalog is catalog:
+                rows = list(
+                    Ingredient.objects.values("id", "name", "measurement_unit")
+                )
+                if catalog is not None and sorted(
+                    rows, key=lambda row: row["id"]
+                ) == sorted(catalog.rows, key=lambda row: row["id"]):
+                    catalog.version = version
+                    catalog.built = time.monotonic()
+                else:
+                    _catalog = IngredientCatalog(rows, version)
+            catalog = _catalog
+    return catalog
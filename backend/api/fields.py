@@ -0,0 +1,217 @@
+import base64
+import binascii
+import io
+import uuid
+from collections.abc import Mapping
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
+
+BASE64_MARKER = ";base64,"
+# Кратно 4, чтобы каждый кусок base64 декодировался отдельно.
+BASE64_CHUNK_SIZE = 256 * 1024
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который берет объекты из заранее
+    загруженного набора вместо SELECT на каждое значение.
+
+    Набор загружается одним запросом IN (...) через prefetch():
+    для many=True это делает BatchedManyRelatedField, для вложенных
+    сериализаторов с many=True - PrefetchListSerializer. Вне этих
+    случаев поле работает как обычный PrimaryKeyRelatedField.
+    Сообщения об ошибках те же, что у PrimaryKeyRelatedField.
+    """
+
+    def __init__(self, **kwargs):
+        self._objects = None
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            raise TypeError
+        model = self.get_queryset().model
+        try:
+            return model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            raise ValueError
+
+    def prefetch(self, values) -> None:
+        """Загружает объекты для всех корректных значений values."""
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except (TypeError, ValueError, serializers.ValidationError):
+                continue
+        self._objects = self.get_queryset().in_bulk(pks)
+
+    def clear(self) -> None:
+        self._objects = None
+
+    def to_internal_value(self, data):
+        if self._objects is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return self._objects[pk]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
+class BatchedManyRelatedField(ManyRelatedField):
+    """Список первичных ключей, которые проверяются одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            return super().to_internal_value(data)
+        data = list(data)
+        self.child_relation.prefetch(data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child_relation.clear()
+
+
+class PrefetchListSerializer(serializers.ListSerializer):
+    """ListSerializer, который перед проверкой элементов одним запросом
+    на модель загружает объекты для BatchedPrimaryKeyRelatedField
+    дочернего сериализатора."""
+
+    def to_internal_value(self, data):
+        fields = []
+        if isinstance(data, list):
+            for field in self.child.fields.values():
+                if isinstance(field, BatchedPrimaryKeyRelatedField):
+                    field.prefetch(
+                        item.get(field.field_name)
+                        for item in data
+                        if isinstance(item, Mapping)
+                    )
+                    fields.append(field)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            for field in fields:
+                field.clear()
+
+
+class Base64ImageField(serializers.ImageField):
+    """Изображение строкой base64 (data URI) или файлом
+    из multipart/form-data.
+
+    base64 декодируется кусками во временный файл, который остается
+    в памяти до FILE_UPLOAD_MAX_MEMORY_SIZE. Размер проверяется по длине
+    строки до декодирования, разрешение - по заголовку изображения
+    из первого куска. Лимиты: IMAGE_MAX_BYTES и IMAGE_MAX_PIXELS.
+    """
+
+    FORMATS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+    default_error_messages = {
+        "invalid_base64": "Некорректная строка base64.",
+        "too_large": "Размер изображения больше {max_bytes} байт.",
+        "too_many_pixels": "Изображение больше {max_pixels} пикселей.",
+        "unsupported_format": "Поддерживаются форматы: {formats}.",
+    }
+
+    def __init__(self, *, max_bytes=None, max_pixels=None, **kwargs):
+        self.max_bytes = max_bytes or settings.IMAGE_MAX_BYTES
+        self.max_pixels = max_pixels or settings.IMAGE_MAX_PIXELS
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if data in ("", None):
+            return None
+        if isinstance(data, str):
+            data = self.decode(data)
+        elif getattr(data, "size", 0) > self.max_bytes:
+            self.fail("too_large", max_bytes=self.max_bytes)
+        file = serializers.FileField.to_internal_value(self, data)
+        image_format = self.check_image(file)
+        file.name = f"{uuid.uuid4()}.{self.FORMATS[image_format]}"
+        file.content_type = Image.MIME[image_format]
+        return file
+
+    def decode(self, data: str) -> UploadedFile:
+        start = data.find(BASE64_MARKER)
+        start = 0 if start == -1 else start + len(BASE64_MARKER)
+        if (len(data) - start) // 4 * 3 > self.max_bytes + 2:
+            self.fail("too_large", max_bytes=self.max_bytes)
+        buffer = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            for position in range(start, len(data), BASE64_CHUNK_SIZE):
+                chunk = base64.b64decode(
+                    data[position:position + BASE64_CHUNK_SIZE],
+                    validate=True,
+                )
+                if position == start:
+                    self.check_header(chunk)
+                buffer.write(chunk)
+        except (binascii.Error, ValueError):
+            buffer.close()
+            self.fail("invalid_base64")
+        except serializers.ValidationError:
+            buffer.close()
+            raise
+        size = buffer.tell()
+        buffer.seek(0)
+        return UploadedFile(buffer, name="image", size=size)
+
+    def check_header(self, head: bytes) -> None:
+        """Ранняя проверка разрешения по первому куску данных.
+        Если заголовок не поместился в кусок, проверка выполняется
+        позже в check_image()."""
+        try:
+            image = Image.open(io.BytesIO(head))
+        except Exception:
+            return
+        self.check_pixels(image)
+
+    def check_pixels(self, image) -> None:
+        width, height = image.size
+        if width * height > self.max_pixels:
+            self.fail("too_many_pixels", max_pixels=self.max_pixels)
+
+    def check_image(self, file) -> str:
+        """Проверяет изображение средствами Pillow, не декодируя пиксели.
+        Returns:
+            str: формат изображения по версии Pillow.
+        """
+        try:
+            file.seek(0)
+            image = Image.open(file)
+            self.check_pixels(image)
+            image_format = image.format
+            image.verify()
+        except serializers.ValidationError:
+            raise
+        except Exception:
+            self.fail("invalid_image")
+        finally:
+            file.seek(0)
+        if image_format not in self.FORMATS:
+            self.fail(
+                "unsupported_format",
+                formats=", ".join(sorted(self.FORMATS.values())),
+            )
+        return image_format
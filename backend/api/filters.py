@@ -1,13 +1,8 @@
 from django_filters.rest_framework import filters, FilterSet
-from rest_framework.filters import SearchFilter
 
 from recipe.models import Recipe
 
 
-class IngredientFilter(SearchFilter):
-    search_param = "name"
-
-
 class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(
         field_name="favorites__user", method="filter_is_favorited"
@@ -0,0 +1,128 @@
+import json
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from api.authentication import cache_stats
+from api.benchmark import Runner, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогон сценариев по docs/openapi-schema.yml внутри процесса: "
+        "p50/p95/p99, число SQL-запросов и размер ответа по маршрутам. "
+        "Запускать на данных из generate_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--schema",
+            default=str(settings.BASE_DIR.parent / "docs/openapi-schema.yml"),
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--output", help="Сохранить результаты в JSON (базовый прогон)."
+        )
+        parser.add_argument(
+            "--compare", help="Сравнить с сохраненным базовым прогоном."
+        )
+        parser.add_argument(
+            "--threshold", type=float, default=0.2,
+            help="Допустимый относительный рост p95.",
+        )
+        parser.add_argument(
+            "--min-ms", type=float, default=1.0,
+            help="Рост p95 меньше этого значения считается шумом.",
+        )
+        parser.add_argument(
+            "--keep-changes", action="store_true",
+            help="Не откатывать изменения в БД после прогона.",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 2:
+            raise CommandError("Нужно хотя бы 2 итерации.")
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            with transaction.atomic():
+                try:
+                    runner = Runner(
+                        options["schema"],
+                        iterations=options["iterations"],
+                        warmup=options["warmup"],
+                    )
+                except (LookupError, OSError) as error:
+                    raise CommandError(error)
+                before = cache_stats()
+                results = runner.run(on_result=self.print_result)
+                token_cache = {
+                    name: value - before[name]
+                    for name, value in cache_stats().items()
+                }
+                uncovered = runner.uncovered_routes(results)
+                if not options["keep_changes"]:
+                    transaction.set_rollback(True)
+        for name in uncovered:
+            self.stdout.write(
+                self.style.WARNING(f"Маршрут без сценария: {name}")
+            )
+        self.stdout.write(
+            "Кэш токенов: "
+            + ", ".join(f"{name}={value}" for name, value in token_cache.items())
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(
+                    {
+                        "meta": {
+                            "created": datetime.now(timezone.utc).isoformat(),
+                            "vendor": connection.vendor,
+                            "iterations": options["iterations"],
+                            "token_cache": token_cache,
+                        },
+                        "routes": results,
+                    },
+                    output,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+        if options["compare"]:
+            self.compare(options, results)
+
+    def print_result(self, key, result):
+        self.stdout.write(
+            f"{key:<60} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} ms {result['queries']:>4} q "
+            f"{result['bytes']:>8} B {result['status']}"
+        )
+
+    def compare(self, options, results):
+        try:
+            with open(options["compare"], encoding="utf-8") as baseline:
+                routes = json.load(baseline)["routes"]
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f"Не удалось прочитать базовый прогон: {error}")
+        rows = compare(
+            routes, results, options["threshold"], options["min_ms"]
+        )
+        regressions = 0
+        for key, result, base, regressed in rows:
+            if base is None:
+                self.stdout.write(f"{key:<60} новый маршрут")
+                continue
+            line = (
+                f"{key:<60} p95 {base['p95_ms']:.2f} -> "
+                f"{result['p95_ms']:.2f} ms, queries {base['queries']} -> "
+                f"{result['queries']}, bytes {base['bytes']} -> "
+                f"{result['bytes']}"
+            )
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"Регрессий: {regressions}.")
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from foodgram.imaging import render_variants
+from foodgram.variants import render_targets, variant_urls
+from recipe.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Построение уменьшенных копий изображений рецептов и аватаров, "
+        "загруженных до появления копий или пропущенных при занятом пуле."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Перестроить и уже существующие копии.",
+        )
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        for model, field in ((Recipe, "image"), (User, "avatar")):
+            names = (
+                model.objects.exclude(**{field: ""})
+                .exclude(**{f"{field}__isnull": True})
+                .values_list(field, flat=True)
+                .iterator()
+            )
+            model_field = model._meta.get_field(field)
+            for name in names:
+                file = model_field.attr_class(None, model_field, name)
+                if not options["force"] and variant_urls(file) is not None:
+                    continue
+                render_args = render_targets(name, file.storage)
+                if render_args is None:
+                    continue
+                try:
+                    render_variants(*render_args)
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                else:
+                    built += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Построено: {built}, ошибок: {failed}.")
+        )
@@ -0,0 +1,139 @@
+import os
+import posixpath
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.storage import HASHED_DIRS
+from recipe.models import Recipe
+
+User = get_user_model()
+
+VARIANTS_DIR = "variants"
+
+
+def iter_files(root: str):
+    """Файлы каталога рекурсивно, через os.scandir без списков."""
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаление медиафайлов recipes/ и avatars/, на которые не ссылается "
+        "ни один рецепт или пользователь, вместе с их уменьшенными копиями, "
+        "и устаревших PDF списков покупок."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Только показать, что будет удалено.",
+        )
+        parser.add_argument(
+            "--grace", type=int, default=24 * 60 * 60,
+            help="Не трогать файлы моложе стольки секунд: они могли "
+                 "быть записаны запросом, который еще не закоммичен.",
+        )
+        parser.add_argument(
+            "--pdf-max-age", type=int, default=7 * 24 * 60 * 60,
+            help="Удалять PDF списков покупок старше стольки секунд "
+                 "(0 - не удалять).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            media_root = default_storage.path("")
+        except NotImplementedError:
+            raise CommandError("Хранилище не поддерживает локальные пути.")
+        referenced = set()
+        for model, field in ((Recipe, "image"), (User, "avatar")):
+            referenced.update(
+                model.objects.exclude(**{f"{field}__isnull": True})
+                .exclude(**{field: ""})
+                .values_list(field, flat=True)
+                .iterator()
+            )
+        stems = {
+            posixpath.splitext(name)[0] for name in referenced
+        }
+        deadline = time.time() - options["grace"]
+        removed = size = 0
+        for directory in HASHED_DIRS:
+            root = os.path.join(media_root, directory)
+            if not os.path.isdir(root):
+                continue
+            for entry in iter_files(root):
+                name = os.path.relpath(entry.path, media_root).replace(
+                    os.sep, "/"
+                )
+                if self.is_referenced(name, referenced, stems):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime > deadline:
+                    continue
+                removed += 1
+                size += stat.st_size
+                if options["dry_run"]:
+                    self.stdout.write(name)
+                else:
+                    os.remove(entry.path)
+        action = "Будет удалено" if options["dry_run"] else "Удалено"
+        self.stdout.write(
+            self.style.SUCCESS(f"{action} файлов: {removed}, {size} байт.")
+        )
+        if options["pdf_max_age"] > 0:
+            removed, size = self.remove_old_pdfs(
+                time.time() - options["pdf_max_age"], options["dry_run"]
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{action} PDF: {removed}, {size} байт."
+                )
+            )
+
+    def remove_old_pdfs(self, deadline: float, dry_run: bool):
+        """Удаляет PDF (и брошенные временные файлы рендеринга)
+        из SHOPPING_LIST_PDF_DIR, измененные раньше deadline.
+        Удаленный список при следующем запросе рендерится заново."""
+        root = settings.SHOPPING_LIST_PDF_DIR
+        removed = size = 0
+        if not os.path.isdir(root):
+            return removed, size
+        for entry in iter_files(root):
+            if not entry.name.endswith((".pdf", ".tmp")):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > deadline:
+                continue
+            removed += 1
+            size += stat.st_size
+            if dry_run:
+                self.stdout.write(entry.path)
+            else:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        return removed, size
+
+    @staticmethod
+    def is_referenced(name: str, referenced: set, stems: set) -> bool:
+        """Файл нужен, если на него ссылается БД или это копия
+        такого файла (recipes/variants/<stem>_<variant>.<ext>)."""
+        if name in referenced:
+            return True
+        directory, filename = posixpath.split(name)
+        if posixpath.basename(directory) != VARIANTS_DIR:
+            return False
+        stem = posixpath.splitext(filename)[0].rpartition("_")[0]
+        return (
+            posixpath.join(posixpath.dirname(directory), stem) in stems
+        )
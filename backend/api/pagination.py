@@ -1,7 +1,231 @@
+import base64
+import binascii
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
-from foodgram.constants import PAGE_SIZE
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.cache import get_version
+from foodgram.constants import MAX_PAGE_SIZE, PAGE_SIZE
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берет количество объектов из кэша.
+
+    Для запросов без фильтров на PostgreSQL можно включить оценку
+    планировщика вместо COUNT(*) (настройка PAGINATION_COUNT_ESTIMATE).
+    """
+
+    def __init__(self, *args, cache_key=None, **kwargs):
+        self.cache_key = cache_key
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = self.estimate_count()
+            if count is None:
+                count = super().count
+            cache.set(
+                self.cache_key, count, settings.PAGINATION_COUNT_TIMEOUT
+            )
+        return count
+
+    def estimate_count(self):
+        query = self.object_list.query
+        if (
+            not settings.PAGINATION_COUNT_ESTIMATE
+            or query.where
+            or query.distinct
+        ):
+            return None
+        connection = connections[self.object_list.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [self.object_list.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if not row or row[0] < settings.PAGINATION_COUNT_ESTIMATE_MIN:
+            return None
+        return row[0]
 
 
 class LimitPagination(PageNumberPagination):
+    """Постраничная пагинация с ?page= и ?limit=.
+
+    При наличии параметра ?cursor= включается keyset-пагинация:
+    страница выбирается условием по ключу сортировки вместо OFFSET,
+    а общее количество не считается. Сортировка берется из атрибута
+    cursor_ordering у view, все поля ключа должны быть уникальны
+    в совокупности (последним полем идет id).
+    """
+
     page_size = PAGE_SIZE
     page_size_query_param = "limit"
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = "cursor"
+    cursor_ordering = ("-pub_date", "-id")
+    invalid_cursor_message = "Неверный курсор."
+    count_ignored_params = (
+        "page", "limit", "cursor", "recipes_limit", "ordering"
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            self.count_cache_key = self.get_count_cache_key(request, view)
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.ordering = getattr(view, "cursor_ordering", self.cursor_ordering)
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+        ordering = (
+            tuple(self._invert(field) for field in self.ordering)
+            if reverse
+            else self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+        results = list(queryset[: page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        self.has_next = has_more if not reverse else True
+        self.has_previous = position is not None if not reverse else has_more
+        self.page_results = results
+        return results
+
+    def django_paginator_class(self, queryset, page_size):
+        return CachedCountPaginator(
+            queryset, page_size, cache_key=self.count_cache_key
+        )
+
+    def get_count_cache_key(self, request, view):
+        """Ключ кэша количества: путь, нормализованный набор фильтров
+        и версии данных, от которых зависит результат.
+        View сообщает эти версии через get_count_cache_scope();
+        без него количество не кэшируется.
+        """
+        get_scope = getattr(view, "get_count_cache_scope", None)
+        if get_scope is None:
+            return None
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in self.count_ignored_params
+        )
+        versions = [
+            f"{namespace}:{get_version(namespace)}"
+            for namespace in get_scope()
+        ]
+        key = json.dumps([request.path, params, versions])
+        return "count:" + hashlib.md5(key.encode()).hexdigest()
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self._cursor_link(self.page_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_results:
+            return None
+        return self._cursor_link(self.page_results[0], reverse=True)
+
+    def decode_cursor(self, request, model):
+        """Возвращает позицию курсора и направление обхода.
+        Пустой ?cursor= означает первую страницу.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = cursor["p"]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+            return position, bool(cursor.get("r"))
+        except (
+            binascii.Error,
+            KeyError,
+            TypeError,
+            ValueError,
+            ValidationError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _cursor_link(self, obj, reverse: bool) -> str:
+        values = [
+            self._dump(getattr(obj, field.lstrip("-")))
+            for field in self.ordering
+        ]
+        cursor = {"p": values}
+        if reverse:
+            cursor["r"] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(cursor, separators=(",", ":")).encode()
+        ).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def _dump(value):
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _invert(field: str) -> str:
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _after(ordering, position) -> Q:
+        """Условие "строго после позиции" для сортировки по нескольким
+        полям: (a > x) or (a = x and b > y) ..."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
@@ -0,0 +1,53 @@
+"""Рендеринг списка покупок в PDF.
+
+Выполняется в процессах пула foodgram.workers, поэтому модуль
+не импортирует Django.
+"""
+import os
+
+from PIL import Image, ImageDraw, ImageFont
+
+PAGE_SIZE = (1240, 1754)
+RESOLUTION = 150
+MARGIN = 100
+FONT_SIZE = 30
+LINE_HEIGHT = 48
+
+
+def load_font(font_path: str, size: int):
+    try:
+        return ImageFont.truetype(font_path, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_shopping_list(rows, path: str, font_path: str, title: str):
+    """Рисует строки (name, measurement_unit, amount) постранично
+    и атомарно сохраняет PDF в path."""
+    font = load_font(font_path, FONT_SIZE)
+    title_font = load_font(font_path, FONT_SIZE + 12)
+    lines_per_page = (PAGE_SIZE[1] - 2 * MARGIN) // LINE_HEIGHT - 2
+    lines = [f"□  {name} ({unit}) — {amount}" for name, unit, amount in rows]
+    pages = []
+    for start in range(0, max(len(lines), 1), lines_per_page):
+        page = Image.new("L", PAGE_SIZE, 255)
+        draw = ImageDraw.Draw(page)
+        top = MARGIN
+        if not pages:
+            draw.text((MARGIN, top), title, font=title_font, fill=0)
+            top += LINE_HEIGHT * 2
+        for line in lines[start:start + lines_per_page]:
+            draw.text((MARGIN, top), line, font=font, fill=0)
+            top += LINE_HEIGHT
+        pages.append(page)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    pages[0].save(
+        temp_path,
+        "PDF",
+        save_all=True,
+        append_images=pages[1:],
+        resolution=RESOLUTION,
+    )
+    os.replace(temp_path, path)
+    return path
@@ -0,0 +1,33 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Текст. Файлы отдаются view напрямую, renderer нужен для
+    выбора формата и для ответов с ошибками."""
+
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and "detail" in data:
+            data = data["detail"]
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class PDFRenderer(PlainTextRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+
+
+SHOPPING_LIST_RENDERERS = (
+    PlainTextRenderer,
+    CSVRenderer,
+    JSONRenderer,
+    PDFRenderer,
+)
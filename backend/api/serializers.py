@@ -1,11 +1,12 @@
 from collections import OrderedDict
 
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from rest_framework.reverse import reverse
 
-from drf_extra_fields.fields import Base64ImageField
-
 from recipe.models import (
     Favorite,
     Ingredient,
@@ -15,7 +16,16 @@ from recipe.models import (
     ShoppingCart,
     Tag,
 )
+from api.fields import (
+    Base64ImageField,
+    BatchedPrimaryKeyRelatedField,
+    PrefetchListSerializer,
+)
 from api.users.serializers import CustomUserProfileSerializer
+from api.viewer import get_viewer, sibling_pks
+from foodgram import constants
+from foodgram.storage import file_sha256
+from foodgram.variants import variant_urls
 
 User = get_user_model()
 
@@ -39,13 +49,14 @@ class TagSerializer(serializers.ModelSerializer):
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для связанной модели рецепта и ингредиента."""
 
-    id = serializers.PrimaryKeyRelatedField(
+    id = BatchedPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(), source="ingredient"
     )
 
     class Meta:
         model = RecipeIngredient
         fields = ("id", "amount")
+        list_serializer_class = PrefetchListSerializer
 
 
 class IngredientGetSerializer(serializers.ModelSerializer):
@@ -72,6 +83,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     image = Base64ImageField()
     author = CustomUserProfileSerializer(read_only=True)
+    image_variants = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -84,12 +96,18 @@ class RecipeSerializer(serializers.ModelSerializer):
             "ingredients",
             "is_favorited",
             "is_in_shopping_cart",
+            "favorites_count",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
         )
 
+    def get_image_variants(self, obj: Recipe):
+        """Уменьшенные копии изображения (card, detail) в webp и jpg."""
+        return variant_urls(obj.image, self.context.get("request"))
+
     def get_is_favorited(self, obj: Recipe) -> bool:
         """Проверяет статус избранного.
         Args:
@@ -97,13 +115,12 @@ class RecipeSerializer(serializers.ModelSerializer):
         Returns:
             bool: true or false.
         """
-        request = self.context.get("request")
-        return (
-            bool(request)
-            and request.user.is_authenticated
-            and request.user.favorites.filter(
-                user=request.user, recipe=obj
-            ).exists()
+        is_favorited = getattr(obj, "is_favorited", None)
+        if is_favorited is not None:
+            return is_favorited
+        viewer = get_viewer(self.context.get("request"))
+        return viewer is not None and viewer.has(
+            "favorites", obj.pk, sibling_pks(self, obj)
         )
 
     def get_is_in_shopping_cart(self, obj: Recipe) -> bool:
@@ -113,20 +130,19 @@ class RecipeSerializer(serializers.ModelSerializer):
         Returns:
             bool: true or false.
         """
-        request = self.context.get("request")
-        return (
-            bool(request)
-            and request.user.is_authenticated
-            and request.user.shopping_cart.filter(
-                user=request.user, recipe=obj
-            ).exists()
+        is_in_shopping_cart = getattr(obj, "is_in_shopping_cart", None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
+        viewer = get_viewer(self.context.get("request"))
+        return viewer is not None and viewer.has(
+            "shopping_cart", obj.pk, sibling_pks(self, obj)
         )
 
 
 class RecipeCreateUpdateDeleteSerializer(serializers.ModelSerializer):
     """Сериализатор страницы рецепта."""
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BatchedPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True
     )
     ingredients = RecipeIngredientSerializer(many=True)
@@ -147,6 +163,18 @@ class RecipeCreateUpdateDeleteSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, intance: Recipe):
+        # DRF сбрасывает кэш prefetch после update(), поэтому связи
+        # загружаются заново двумя запросами, а не по одному на строку.
+        prefetch_related_objects(
+            [intance],
+            "tags",
+            Prefetch(
+                "recipeingredient_set",
+                queryset=RecipeIngredient.objects.select_related(
+                    "ingredient"
+                ),
+            ),
+        )
         return RecipeSerializer(intance, context=self.context).data
 
     def validate(self, data):
@@ -204,46 +232,133 @@ class RecipeCreateUpdateDeleteSerializer(serializers.ModelSerializer):
             for ingredient_data in ingredients_data
         ]
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        # Объекты уже загружены при валидации: ответ строится из них,
+        # без повторных запросов тэгов и ингредиентов.
+        obj._prefetched_objects_cache = {
+            "tags": list(tags_data),
+            "recipeingredient_set": recipe_ingredients,
+        }
         return obj
 
     def create(self, validated_data: OrderedDict):
         tags_data = validated_data.pop("tags")
         ingredients_data = validated_data.pop("ingredients")
-        recipe = Recipe.objects.create(
-            author=self.context["request"].user, **validated_data
-        )
-        self.add_tags_ingredients(recipe, tags_data, ingredients_data)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                author=self.context["request"].user, **validated_data
+            )
+            self.add_tags_ingredients(recipe, tags_data, ingredients_data)
         return recipe
 
     def update(self, instance, validated_data):
-        instance.name = validated_data.get("name", instance.name)
-        instance.image = validated_data.get("image", instance.image)
-        instance.cooking_time = validated_data.get(
-            "cooking_time", instance.cooking_time
-        )
-        instance.text = validated_data.get("text", instance.text)
-        tags = validated_data.pop("tags")
-        ingredients = validated_data.pop("ingredients")
-        instance.ingredients.clear()
-        instance.tags.clear()
-        self.add_tags_ingredients(
-            obj=instance, tags_data=tags, ingredients_data=ingredients
-        )
-        instance.save()
+        """Обновляет только изменившиеся поля, тэги и строки ингредиентов.
+        Изображение перезаписывается, только если изменилось содержимое.
+        """
+        tags = validated_data.pop("tags", None)
+        ingredients = validated_data.pop("ingredients", None)
+        image = validated_data.pop("image", None)
+        changed_fields = [
+            field
+            for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        if image is not None and not self.same_image(instance.image, image):
+            instance.image = image
+            changed_fields.append("image")
+        with transaction.atomic(), ShoppingCart.deferred_versions():
+            if changed_fields:
+                instance.save(update_fields=changed_fields)
+            if tags is not None:
+                self.update_tags(instance, tags)
+            if ingredients is not None and self.update_ingredients(
+                instance, ingredients
+            ):
+                ShoppingCart.bump_recipe_versions(instance.pk)
         return instance
 
+    @staticmethod
+    def same_image(current, new) -> bool:
+        """Совпадает ли содержимое нового изображения с сохраненным."""
+        if not current:
+            return False
+        try:
+            with current.open("rb") as current_file:
+                current_digest = file_sha256(current_file)
+        except OSError:
+            return False
+        return current_digest == file_sha256(new)
+
+    @staticmethod
+    def update_tags(instance: Recipe, tags: list[Tag]) -> None:
+        current = set(instance.tags.values_list("id", flat=True))
+        new = {tag.id for tag in tags}
+        if current - new:
+            instance.tags.remove(*(current - new))
+        if new - current:
+            instance.tags.add(*(new - current))
+
+    @staticmethod
+    def update_ingredients(instance: Recipe, ingredients_data) -> bool:
+        """Приводит строки RecipeIngredient к переданному списку:
+        удаляет лишние, меняет количество и добавляет новые.
+        Returns:
+            bool: были ли изменения.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in instance.recipeingredient_set.all()
+        }
+        new = {
+            item["ingredient"].id: item["amount"] for item in ingredients_data
+        }
+        removed = current.keys() - new.keys()
+        changed = [
+            row
+            for ingredient_id, row in current.items()
+            if ingredient_id in new and row.amount != new[ingredient_id]
+        ]
+        added = [
+            RecipeIngredient(
+                recipe=instance,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in current
+        ]
+        if removed:
+            instance.recipeingredient_set.filter(
+                ingredient_id__in=removed
+            ).delete()
+        for row in changed:
+            row.amount = new[row.ingredient_id]
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        return bool(removed or changed or added)
+
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор рецептов с укороченными данными."""
 
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
+
+    def get_image_variants(self, obj: Recipe):
+        return variant_urls(obj.image, self.context.get("request"))
 
 
 class FavoritesSerializer(serializers.ModelSerializer):
     """Сериализатор избранного."""
 
+    duplicate_message = "Рецепт уже добавлен в избранное."
+
     class Meta:
         model = Favorite
         fields = (
@@ -256,19 +371,12 @@ class FavoritesSerializer(serializers.ModelSerializer):
             instance.recipe, context={"request": self.context.get("request")}
         ).data
 
-    def validate(self, data: OrderedDict):
-        recipe = data.get("recipe")
-        user = data.get("user")
-        if user.favorites.filter(recipe=recipe).exists():
-            raise serializers.ValidationError(
-                "Рецепт уже добавлен в избранное."
-            )
-        return data
-
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
     """Сериализатор списка покупок."""
 
+    duplicate_message = "Рецепт уже добавлен в список."
+
     class Meta:
         model = ShoppingCart
         fields = (
@@ -281,37 +389,63 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             instance.recipe, context={"request": self.context.get("request")}
         ).data
 
-    def validate(self, data: OrderedDict):
-        recipe = data.get("recipe")
-        user = data.get("user")
-        if user.shopping_cart.filter(recipe=recipe).exists():
-            raise serializers.ValidationError("Рецепт уже добавлен в список.")
-        return data
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления и удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=constants.BULK_MAX_RECIPES,
+    )
+
+    def validate_recipes(self, value: list[int]) -> list[int]:
+        return list(dict.fromkeys(value))
 
 
 class ShortLinkSerializer(serializers.ModelSerializer):
-    """Сериализатор короткой ссылки."""
+    """Сериализатор короткой ссылки.
+    Ссылка одна на рецепт и ищется по индексу recipe_id, код
+    выводится из id рецепта (см. Link.create_short_code).
+    """
+
+    pk = serializers.IntegerField(write_only=True)
 
     class Meta:
         model = Link
-        fields = ("original_link", "short_link", "short_code")
+        fields = ("pk", "original_link", "short_link", "short_code")
         extra_kwargs = {"short_code": {"write_only": True}}
 
     def create(self, validated_data):
         request = self.context.get("request")
-        pk = self.initial_data.get("pk")
-        recipe_detail_url = reverse(
-            "recipes-detail",
-            args=[pk]
-        ).replace("api/", "")
+        recipe_id = validated_data["pk"]
         host = request.META.get('HTTP_HOST')
-        original_link = f"https://{host}" f"{recipe_detail_url}"
-        link, _ = Link.objects.get_or_create(
-            original_link=original_link, **validated_data
-        )
+        link = Link.objects.filter(recipe_id=recipe_id).first()
+        if link is None:
+            link = self.create_link(recipe_id, host)
         link.short_link = host
-        link.save()
         return link
 
+    @staticmethod
+    def create_link(recipe_id: int, host: str) -> Link:
+        if not Recipe.objects.filter(pk=recipe_id).exists():
+            raise NotFound("Рецепт не найден.")
+        recipe_detail_url = reverse(
+            "recipes-detail",
+            args=[recipe_id]
+        ).replace("api/", "")
+        try:
+            with transaction.atomic():
+                return Link.objects.create(
+                    recipe_id=recipe_id,
+                    original_link=f"https://{host}{recipe_detail_url}",
+                )
+        except IntegrityError:
+            # Ссылку успел создать параллельный запрос.
+            link = Link.objects.filter(recipe_id=recipe_id).first()
+            if link is None:
+                raise NotFound("Рецепт не найден.")
+            return link
+
     def to_representation(self, instance):
         return {"short-link": instance.short_link}
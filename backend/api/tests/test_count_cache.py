@@ -0,0 +1,125 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from recipe.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+PNG = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywa"
+    "AAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQV"
+    "QImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=="
+)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CountCacheTests(APITestCase):
+    """Закэшированное количество пагинации сбрасывается изменениями."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="user@example.com",
+            username="user",
+            first_name="First",
+            last_name="Last",
+            password="password-123",
+        )
+        cls.tag = Tag.objects.create(name="tag", slug="tag")
+        cls.ingredient = Ingredient.objects.create(
+            name="ingredient", measurement_unit="г"
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user,
+                name=f"recipe{i}",
+                text="text",
+                cooking_time=10,
+            )
+            for i in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count(self, params: str = "") -> int:
+        response = self.client.get(f"/api/recipes/?limit=1{params}")
+        self.assertEqual(response.status_code, 200)
+        return response.data["count"]
+
+    def test_count_is_cached(self):
+        self.count()
+        with CaptureQueriesContext(connection) as context:
+            self.count()
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_create_and_delete(self):
+        self.assertEqual(self.count(), 3)
+        response = self.client.post(
+            "/api/recipes/",
+            {
+                "name": "new",
+                "text": "text",
+                "cooking_time": 5,
+                "image": PNG,
+                "tags": [self.tag.id],
+                "ingredients": [{"id": self.ingredient.id, "amount": 2}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.count(), 4)
+        response = self.client.delete(f"/api/recipes/{response.data['id']}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.count(), 3)
+
+    def check_relation(self, name: str, param: str) -> None:
+        self.assertEqual(self.count(param), 0)
+        recipe_id = self.recipes[0].id
+        response = self.client.post(f"/api/recipes/{recipe_id}/{name}/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.count(param), 1)
+        response = self.client.post(
+            f"/api/recipes/{name}/bulk/",
+            {"recipes": [recipe.id for recipe in self.recipes]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.count(param), 3)
+        response = self.client.delete(
+            f"/api/recipes/{name}/bulk/",
+            {"recipes": [self.recipes[1].id]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.count(param), 2)
+        response = self.client.delete(f"/api/recipes/{recipe_id}/{name}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.count(param), 1)
+        self.assertEqual(self.count(), 3)
+
+    def test_favorite(self):
+        self.check_relation("favorite", "&is_favorited=1")
+
+    def test_shopping_cart(self):
+        self.check_relation("shopping_cart", "&is_in_shopping_cart=1")
+        response = self.client.delete("/api/recipes/shopping_cart/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.count("&is_in_shopping_cart=1"), 0)
@@ -0,0 +1,225 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework.test import APIClient, APITestCase
+
+from recipe.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def create_user(name: str):
+    return User.objects.create_user(
+        email=f"{name}@example.com",
+        username=name,
+        first_name="First",
+        last_name="Last",
+        password="password-123",
+    )
+
+
+class CountersTests(APITestCase):
+    """Счетчики избранного, покупок, рецептов и подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.fans = [create_user(f"fan{i}") for i in range(3)]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name=f"recipe{i}",
+                text="text",
+                cooking_time=10,
+            )
+            for i in range(3)
+        ]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assert_counts(self, obj, **expected) -> None:
+        obj.refresh_from_db()
+        self.assertEqual(
+            {field: getattr(obj, field) for field in expected}, expected
+        )
+
+    def test_recipes_count(self):
+        self.assert_counts(self.author, recipes_count=3)
+        Recipe.objects.filter(pk=self.recipes[0].pk).delete()
+        self.assert_counts(self.author, recipes_count=2)
+
+    def test_favorite_and_cart(self):
+        recipe = self.recipes[0]
+        for name, field in (
+            ("favorite", "favorites_count"),
+            ("shopping_cart", "in_carts_count"),
+        ):
+            with self.subTest(name=name):
+                for fan in self.fans:
+                    response = self.client_for(fan).post(
+                        f"/api/recipes/{recipe.id}/{name}/"
+                    )
+                    self.assertEqual(response.status_code, 201)
+                # Повторное добавление счетчик не меняет.
+                response = self.client_for(self.fans[0]).post(
+                    f"/api/recipes/{recipe.id}/{name}/"
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assert_counts(recipe, **{field: 3})
+                response = self.client_for(self.fans[0]).delete(
+                    f"/api/recipes/{recipe.id}/{name}/"
+                )
+                self.assertEqual(response.status_code, 204)
+                self.assert_counts(recipe, **{field: 2})
+                response = self.client_for(self.fans[1]).post(
+                    f"/api/recipes/{name}/bulk/",
+                    {"recipes": [r.id for r in self.recipes]},
+                    format="json",
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assert_counts(recipe, **{field: 2})
+                self.assert_counts(self.recipes[1], **{field: 1})
+                response = self.client_for(self.fans[1]).delete(
+                    f"/api/recipes/{name}/bulk/",
+                    {"recipes": [r.id for r in self.recipes]},
+                    format="json",
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assert_counts(recipe, **{field: 1})
+                self.assert_counts(self.recipes[1], **{field: 0})
+
+    def test_subscriptions(self):
+        for fan in self.fans:
+            response = self.client_for(fan).post(
+                f"/api/users/{self.author.id}/subscribe/"
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assert_counts(self.author, followers_count=3, following_count=0)
+        self.assert_counts(self.fans[0], following_count=1)
+        response = self.client_for(self.fans[0]).delete(
+            f"/api/users/{self.author.id}/subscribe/"
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_counts(self.author, followers_count=2)
+        self.assert_counts(self.fans[0], following_count=0)
+
+    def test_recipe_delete(self):
+        recipe = self.recipes[0]
+        for fan in self.fans:
+            Favorite.objects.create(user=fan, recipe=recipe)
+            ShoppingCart.objects.create(user=fan, recipe=recipe)
+            Favorite.objects.create(user=fan, recipe=self.recipes[1])
+        response = self.client_for(self.author).delete(
+            f"/api/recipes/{recipe.id}/"
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_counts(self.author, recipes_count=2)
+        self.assert_counts(self.recipes[1], favorites_count=3)
+
+    def test_user_delete(self):
+        Subscription.objects.create(user=self.fans[0], following=self.author)
+        Subscription.objects.create(user=self.author, following=self.fans[1])
+        Favorite.objects.create(user=self.author, recipe=self.recipes[0])
+        response = self.client_for(self.author).delete(
+            f"/api/users/{self.author.id}/",
+            {"current_password": "password-123"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_counts(self.fans[0], following_count=0)
+        self.assert_counts(self.fans[1], followers_count=0)
+
+    def test_owner_change(self):
+        Favorite.objects.create(user=self.fans[0], recipe=self.recipes[0])
+        recipe = self.recipes[0]
+        recipe.author = self.fans[1]
+        recipe.save()
+        self.assert_counts(self.author, recipes_count=2)
+        self.assert_counts(self.fans[1], recipes_count=1)
+        favorite = Favorite.objects.get(user=self.fans[0])
+        favorite.recipe = self.recipes[1]
+        favorite.save()
+        self.assert_counts(self.recipes[0], favorites_count=0)
+        self.assert_counts(self.recipes[1], favorites_count=1)
+
+
+class ReconcileCountersTests(APITestCase):
+    """Команда reconcile_counters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.fan = create_user("fan")
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name=f"recipe{i}",
+                text="text",
+                cooking_time=10,
+            )
+            for i in range(5)
+        ]
+        Favorite.objects.create(user=cls.fan, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.fan, recipe=cls.recipes[0])
+        Subscription.objects.create(user=cls.fan, following=cls.author)
+
+    def reconcile(self, *args) -> str:
+        out = StringIO()
+        call_command("reconcile_counters", *args, stdout=out)
+        return out.getvalue()
+
+    def test_fixes_drift(self):
+        # QuerySet.update() сигналов не вызывает.
+        Recipe.objects.update(favorites_count=7, in_carts_count=0)
+        User.objects.update(
+            recipes_count=0, followers_count=5, following_count=5
+        )
+        output = self.reconcile("--batch-size", "2")
+        self.assertIn("recipe.Recipe.favorites_count: проверено 5, "
+                      "исправлено 5", output)
+        self.assertIn("recipe.Recipe.in_carts_count: проверено 5, "
+                      "исправлено 1", output)
+        self.assertIn("users.CustomUser.recipes_count: проверено 2, "
+                      "исправлено 1", output)
+        self.assertEqual(
+            list(
+                Recipe.objects.order_by("id").values_list(
+                    "favorites_count", "in_carts_count"
+                )
+            ),
+            [(1, 1)] + [(0, 0)] * 4,
+        )
+        self.author.refresh_from_db()
+        self.fan.refresh_from_db()
+        self.assertEqual(
+            (
+                self.author.recipes_count,
+                self.author.followers_count,
+                self.author.following_count,
+            ),
+            (5, 1, 0),
+        )
+        self.assertEqual(
+            (self.fan.followers_count, self.fan.following_count), (0, 1)
+        )
+        # Повторный прогон ничего не меняет.
+        self.assertEqual(self.reconcile().count("исправлено 0"), 5)
+
+    def test_single_counter(self):
+        Recipe.objects.update(favorites_count=3, in_carts_count=3)
+        output = self.reconcile("--counter", "recipe.Recipe.in_carts_count")
+        self.assertEqual(output.count("проверено"), 1)
+        self.assertEqual(
+            set(Recipe.objects.values_list("favorites_count", flat=True)),
+            {3},
+        )
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(CommandError):
+            self.reconcile("--batch-size", "0")
@@ -0,0 +1,113 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient, APITestCase
+
+from recipe.models import Favorite, Recipe
+
+User = get_user_model()
+
+URL = "/api/recipes/"
+
+
+def encode(cursor) -> str:
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+class CursorPaginationTests(APITestCase):
+    """Keyset-пагинация по ?cursor=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email="author@example.com",
+            username="author",
+            first_name="Author",
+            last_name="User",
+            password="password-123",
+        )
+        fans = [
+            User.objects.create_user(
+                email=f"fan{i}@example.com",
+                username=f"fan{i}",
+                first_name="Fan",
+                last_name=str(i),
+                password="password-123",
+            )
+            for i in range(3)
+        ]
+        for i in range(11):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f"recipe{i}",
+                text="text",
+                cooking_time=i % 4 + 1,
+            )
+            for fan in fans[: i % 4]:
+                Favorite.objects.create(user=fan, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url: str, link: str = "next") -> tuple:
+        """Обходит страницы по ссылке link, возвращает id и ответы."""
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            pages.append(response.data)
+            page_ids = [item["id"] for item in response.data["results"]]
+            ids.extend(page_ids if link == "next" else page_ids[::-1])
+            url = response.data[link]
+        return ids, pages
+
+    def test_next_and_previous_round_trip(self):
+        expected = list(
+            Recipe.objects.order_by("-pub_date", "-id").values_list(
+                "id", flat=True
+            )
+        )
+        ids, pages = self.walk(f"{URL}?cursor=&limit=3")
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 4)
+        self.assertIsNone(pages[0]["previous"])
+        self.assertIsNone(pages[-1]["next"])
+        back, back_pages = self.walk(pages[-1]["previous"], "previous")
+        self.assertEqual(back[::-1], expected[:-2])
+        self.assertEqual(
+            [page["results"] for page in back_pages[::-1]],
+            [page["results"] for page in pages[:-1]],
+        )
+
+    def test_ordering(self):
+        for ordering, key in (
+            ("favorites_count", ("favorites_count", "id")),
+            ("-favorites_count", ("-favorites_count", "-id")),
+            ("pub_date", ("pub_date", "id")),
+            # Поля не из ordering_fields не меняют сортировку.
+            ("cooking_time", ("-pub_date", "-id")),
+        ):
+            with self.subTest(ordering=ordering):
+                expected = list(
+                    Recipe.objects.order_by(*key).values_list(
+                        "id", flat=True
+                    )
+                )
+                ids, _ = self.walk(
+                    f"{URL}?cursor=&limit=4&ordering={ordering}"
+                )
+                self.assertEqual(ids, expected)
+
+    def test_malformed_cursor(self):
+        for cursor in (
+            "not-a-cursor",
+            base64.urlsafe_b64encode(b"[1, 2]").decode(),
+            encode({"p": [1]}),
+            encode({"p": ["not-a-date", 1]}),
+            encode({"x": 1}),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(URL, {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
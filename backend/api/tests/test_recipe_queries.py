@@ -0,0 +1,96 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from recipe.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+URL = "/api/recipes/?limit={}"
+
+
+class RecipeListQueriesTests(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="viewer@example.com",
+            username="viewer",
+            first_name="Viewer",
+            last_name="User",
+            password="password-123",
+        )
+        authors = [
+            User.objects.create_user(
+                email=f"author{i}@example.com",
+                username=f"author{i}",
+                first_name="Author",
+                last_name=str(i),
+                password="password-123",
+            )
+            for i in range(4)
+        ]
+        tags = [Tag.objects.create(name=f"tag{i}", slug=f"tag{i}")
+                for i in range(3)]
+        ingredients = [
+            Ingredient.objects.create(name=f"ingredient{i}",
+                                      measurement_unit="г")
+            for i in range(5)
+        ]
+        for i in range(20):
+            recipe = Recipe.objects.create(
+                author=authors[i % len(authors)],
+                name=f"recipe{i}",
+                text="text",
+                cooking_time=10,
+            )
+            recipe.tags.set(tags[: i % 3 + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1
+                )
+                for ingredient in ingredients[: i % 4 + 1]
+            )
+            if i % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if i % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.create(user=cls.user, following=authors[0])
+
+    def count_queries(self, client, limit: int) -> int:
+        # Количество объектов пагинации кэшируется, поэтому каждый
+        # замер начинается с пустого кэша.
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(URL.format(limit))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), limit)
+        return len(context.captured_queries)
+
+    def assert_constant(self, client) -> None:
+        small = self.count_queries(client, 2)
+        large = self.count_queries(client, 16)
+        self.assertEqual(
+            small,
+            large,
+            f"limit=2: {small} запросов, limit=16: {large} запросов",
+        )
+
+    def test_anonymous_list(self):
+        self.assert_constant(APIClient())
+
+    def test_authenticated_list(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_constant(client)
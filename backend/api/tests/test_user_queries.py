@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from recipe.models import Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+SUBSCRIPTIONS_URL = "/api/users/subscriptions/"
+
+
+def create_user(name: str):
+    return User.objects.create_user(
+        email=f"{name}@example.com",
+        username=name,
+        first_name="First",
+        last_name="Last",
+        password="password-123",
+    )
+
+
+class UserQueriesTests(APITestCase):
+    """Число запросов подписок и списка пользователей постоянно."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("viewer")
+        cls.authors = [create_user(f"author{i}") for i in range(6)]
+        for i, author in enumerate(cls.authors):
+            for j in range(i + 2):
+                Recipe.objects.create(
+                    author=author,
+                    name=f"recipe{i}-{j}",
+                    text="text",
+                    cooking_time=10,
+                )
+            Subscription.objects.create(user=cls.user, following=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url: str) -> tuple:
+        # Количество объектов пагинации кэшируется, поэтому каждый
+        # замер начинается с пустого кэша.
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_subscriptions_queries(self):
+        for params in ("", "?recipes_limit=1", "?recipes_limit=10",
+                       "?limit=2", "?limit=6&recipes_limit=3"):
+            with self.subTest(params=params):
+                _, queries = self.count_queries(
+                    SUBSCRIPTIONS_URL + params
+                )
+                self.assertEqual(queries, 3)
+
+    def test_subscriptions_recipes_limit(self):
+        response, _ = self.count_queries(
+            SUBSCRIPTIONS_URL + "?recipes_limit=2"
+        )
+        for item in response.data["results"]:
+            author = User.objects.get(pk=item["id"])
+            self.assertEqual(
+                len(item["recipes"]), min(2, author.recipes_count)
+            )
+            self.assertEqual(item["recipes_count"], author.recipes_count)
+
+    def test_users_list_queries(self):
+        for params in ("", "?limit=2", "?limit=7"):
+            with self.subTest(params=params):
+                _, queries = self.count_queries("/api/users/" + params)
+                self.assertLessEqual(queries, 2)
+
+    def test_users_list_is_subscribed(self):
+        Subscription.objects.filter(following=self.authors[0]).delete()
+        response, _ = self.count_queries("/api/users/?limit=10")
+        subscribed = {
+            item["id"]: item["is_subscribed"]
+            for item in response.data["results"]
+        }
+        self.assertFalse(subscribed[self.authors[0].pk])
+        self.assertTrue(subscribed[self.authors[1].pk])
+        self.assertFalse(subscribed[self.user.pk])
@@ -1,31 +1,16 @@
-import base64
-
-from django.db.models import QuerySet
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
 
 from djoser.serializers import UserSerializer as DjoserMeUS
 
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
-from users.models import Subscription
+from api.fields import Base64ImageField
+from api.viewer import get_viewer, sibling_pks
+from foodgram.variants import variant_urls
 
 User = get_user_model()
 
 
-class Base64ImageField(serializers.ImageField):
-    """Преобразование изображения в текстовую строку."""
-
-    def to_internal_value(self, data: str):
-        if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
-
-        return super().to_internal_value(data)
-
-
 class AvatarSerializer(serializers.ModelSerializer):
     """Сериализатор для аватара."""
 
@@ -47,6 +32,7 @@ class CustomUserProfileSerializer(DjoserMeUS):
 
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField()
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -58,8 +44,13 @@ class CustomUserProfileSerializer(DjoserMeUS):
             "last_name",
             "is_subscribed",
             "avatar",
+            "avatar_variants",
         )
 
+    def get_avatar_variants(self, obj: User):
+        """Уменьшенная копия аватара в webp и jpg."""
+        return variant_urls(obj.avatar, self.context.get("request"))
+
     def get_is_subscribed(self, obj: User) -> bool:
         """Проверяет статус подписки.
         Args:
@@ -67,49 +58,19 @@ class CustomUserProfileSerializer(DjoserMeUS):
         Returns:
             bool: true or false.
         """
-        request = self.context.get("request")
-        return (
-            bool(request)
-            and request.user.is_authenticated
-            and Subscription.objects.filter(
-                user=request.user,
-                following=obj
-            ).exists()
-            and not obj == request.user
-        )
-
-
-class SubscribeSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписки."""
-
-    class Meta:
-        model = Subscription
-        fields = ("user", "following")
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=["user", "following"],
-            )
-        ]
-
-    def to_representation(self, instance):
-        return SubscribeGetSerializer(
-            instance.following, context={
-                "request": self.context.get("request")
-            }
-        ).data
-
-    def validate_following(self, val):
-        if self.context["request"].user == val:
-            raise serializers.ValidationError("Нельзя подписаться на себя.")
-        return val
+        is_subscribed = getattr(obj, "is_subscribed", None)
+        if is_subscribed is not None:
+            return is_subscribed
+        viewer = get_viewer(self.context.get("request"))
+        if viewer is None or obj.pk == viewer.user.pk:
+            return False
+        return viewer.has("following", obj.pk, sibling_pks(self, obj))
 
 
 class SubscribeGetSerializer(CustomUserProfileSerializer):
     """Сериализатор для отображения всех подписанных пользователей,
     их рецептов, количества рецептов."""
 
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
     class Meta(CustomUserProfileSerializer.Meta):
@@ -118,26 +79,33 @@ class SubscribeGetSerializer(CustomUserProfileSerializer):
             "recipes_count",
         )
 
-    def get_recipes_count(self, obj: User) -> int:
-        """Подсчет количества рецептов."""
-        return obj.recipes.count()
+    @staticmethod
+    def get_recipes_limit(request):
+        """Значение ?recipes_limit= или None, если рецепты
+        не ограничены (параметр не задан или некорректен)."""
+        try:
+            limit = int(request.query_params["recipes_limit"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return max(limit, 0)
 
-    def get_recipes(self, obj: User) -> QuerySet[dict]:
-        """Получает список репептов пользователя.
+    def get_recipes(self, obj: User) -> list:
+        """Получает список последних рецептов пользователя.
         Args:
             recipe (User): исходный пользователь.
 
         Returns:
-            QuerySet[dict]: Список рецептов пользователя.
+            list: Список рецептов пользователя, новые первыми.
         """
         from api.serializers import RecipeShortSerializer
 
-        request = self.context.get("request")
-        recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get("recipes_limit", 0)
-        try:
-            recipes = recipes[: int(recipes_limit)]
-        except (TypeError, ValueError):
-            pass
-        serializer = RecipeShortSerializer(recipes, many=True, read_only=True)
+        recipes = getattr(obj, "recent_recipes", None)
+        if recipes is None:
+            recipes = obj.recipes.order_by("-pub_date", "-id")
+            limit = self.get_recipes_limit(self.context["request"])
+            if limit is not None:
+                recipes = recipes[:limit]
+        serializer = RecipeShortSerializer(
+            recipes, many=True, read_only=True, context=self.context
+        )
         return serializer.data
@@ -1,20 +1,36 @@
 from django.contrib.auth import get_user_model
-
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Value,
+    Window,
+    prefetch_related_objects,
+)
+from django.db.models.functions import RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet as DjoserUserViewset
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator
 
 
 from api.pagination import LimitPagination
+from foodgram.cache import bump_version, user_namespace
 from api.users.serializers import (
     CustomUserProfileSerializer,
-    SubscribeSerializer,
     SubscribeGetSerializer,
     AvatarSerializer,
 )
+from recipe import counters
+from recipe.models import Recipe
 from users.models import Subscription
 
 User = get_user_model()
@@ -30,6 +46,37 @@ class UserViewSet(DjoserUserViewset):
     queryset = User.objects.all()
     serializer_class = CustomUserProfileSerializer
     pagination_class = LimitPagination
+    cursor_ordering = ("id",)
+    lookup_value_regex = r"\d+"
+
+    def get_queryset(self):
+        """Список и профиль: подписка текущего пользователя считается
+        в основном запросе, сортировка по первичному ключу."""
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_subscribed=Exists(
+                    Subscription.objects.filter(
+                        user=user, following=OuterRef("pk")
+                    )
+                )
+            )
+        return queryset.order_by("id")
+
+    def get_count_cache_scope(self) -> list[str]:
+        """Версии данных, от которых зависит количество пользователей."""
+        if self.action == "subscriptions":
+            return ["users", user_namespace(self.request.user.id)]
+        return ["users"]
+
+    def perform_destroy(self, instance):
+        """Счетчики рецептов и других пользователей обновляются пачкой
+        после каскадного удаления, а не UPDATE на каждую связь."""
+        with transaction.atomic(), counters.deferred():
+            super().perform_destroy(instance)
 
     @action(
         detail=True,
@@ -39,22 +86,34 @@ class UserViewSet(DjoserUserViewset):
     )
     def subscribe(self, request, **kwargs) -> Response:
         """Создаёт связь между пользователями.
+        Повторную подписку отсекает уникальный индекс (user, following).
         Args:
             request: Request.
         Returns:
             Response: статус подписки.
         """
-        serializer = SubscribeSerializer(
-            data={
-                "user": get_object_or_404(User, id=request.user.id).id,
-                "following": get_object_or_404(
-                    User, id=self.kwargs.get("id")
-                ).id,
-            },
-            context={"request": request},
+        following = get_object_or_404(User, id=self.kwargs.get("id"))
+        if following.id == request.user.id:
+            raise ValidationError(
+                {"following": ["Нельзя подписаться на себя."]}
+            )
+        try:
+            with transaction.atomic():
+                Subscription.objects.create(
+                    user=request.user, following=following
+                )
+        except IntegrityError:
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    UniqueTogetherValidator.message.format(
+                        field_names="user, following"
+                    )
+                ]}
+            )
+        bump_version(user_namespace(request.user.id))
+        serializer = SubscribeGetSerializer(
+            following, context={"request": request}
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
@@ -65,11 +124,14 @@ class UserViewSet(DjoserUserViewset):
         Returns:
             Response: статус подписки.
         """
-        following = get_object_or_404(User, id=self.kwargs.get("id"))
-        user = request.user.id
+        following_id = self.kwargs.get("id")
         deleted, _ = Subscription.objects.filter(
-            following=following, user=user
+            following_id=following_id, user=request.user
         ).delete()
+        if deleted:
+            bump_version(user_namespace(request.user.id))
+        elif not User.objects.filter(id=following_id).exists():
+            raise Http404
         return (
             Response(
                 "Пользователь отсутствует в подписках.",
@@ -93,13 +155,43 @@ class UserViewSet(DjoserUserViewset):
         Returns:
             Response: список подписок.
         """
-        subscriptions = User.objects.filter(following__user=request.user)
+        subscriptions = (
+            User.objects.filter(following__user=request.user)
+            .annotate(is_subscribed=Value(True))
+            .order_by("id")
+        )
         pages = self.paginate_queryset(subscriptions)
+        prefetch_related_objects(
+            pages,
+            Prefetch(
+                "recipes",
+                queryset=self.recent_recipes(
+                    SubscribeGetSerializer.get_recipes_limit(request)
+                ),
+                to_attr="recent_recipes",
+            ),
+        )
         serializer = SubscribeGetSerializer(
             pages, many=True, context={"request": request}
         )
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def recent_recipes(limit):
+        """Рецепты авторов, новые первыми. При заданном limit -
+        не больше limit на автора: ROW_NUMBER() по автору считается
+        в том же запросе, что и выборка для prefetch."""
+        recipes = Recipe.objects.order_by("-pub_date", "-id")
+        if limit is None:
+            return recipes
+        return recipes.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F("author_id"),
+                order_by=(F("pub_date").desc(), F("id").desc()),
+            )
+        ).filter(row_number__lte=limit)
+
     @action(
         detail=False, methods=["get"],
         permission_classes=(IsAuthenticated,)
@@ -128,6 +220,8 @@ class UserViewSet(DjoserUserViewset):
     @avatar.mapping.delete
     def delete_avatar(self, request) -> Response:
         """Удаление аватара."""
-        request.user.avatar.delete(save=True)
-        request.user.save()
+        # Файл может быть общим с другими пользователями (имя по
+        # содержимому), его удалит gc_media, когда ссылок не останется.
+        request.user.avatar = None
+        request.user.save(update_fields=["avatar"])
         return Response(status=status.HTTP_204_NO_CONTENT)
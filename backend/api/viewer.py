@@ -0,0 +1,87 @@
+"""Связи текущего пользователя в пределах одного запроса.
+
+Избранное, список покупок и подписки проверяются не по всей истории
+пользователя, а только для объектов ответа: при первом обращении
+сериализатора к связи одним запросом загружаются id всей страницы
+(для вложенного автора - авторы всех рецептов страницы). Повторные
+проверки, например один автор на 16 карточках, отвечаются из памяти.
+"""
+from collections import defaultdict
+
+from rest_framework.serializers import ListSerializer
+
+from recipe.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+REQUEST_ATTR = "_foodgram_viewer"
+
+# Связь: модель и поле с id объекта, для которого проверяется флаг.
+RELATIONS = {
+    "favorites": (Favorite, "recipe_id"),
+    "shopping_cart": (ShoppingCart, "recipe_id"),
+    "following": (Subscription, "following_id"),
+}
+
+
+class Viewer:
+    """Известные связи пользователя с объектами текущего ответа."""
+
+    def __init__(self, user):
+        self.user = user
+        self._checked = defaultdict(set)
+        self._found = defaultdict(set)
+
+    def has(self, relation: str, pk: int, candidates=()) -> bool:
+        """Проверяет связь с объектом pk.
+        Args:
+            relation (str): ключ RELATIONS.
+            pk (int): id рецепта или автора.
+            candidates: id, которые стоит проверить тем же запросом.
+        Returns:
+            bool: true or false.
+        """
+        checked = self._checked[relation]
+        if pk not in checked:
+            ids = {pk, *candidates} - checked
+            model, key = RELATIONS[relation]
+            self._found[relation].update(
+                model.objects.filter(
+                    user=self.user, **{f"{key}__in": ids}
+                ).values_list(key, flat=True)
+            )
+            checked |= ids
+        return pk in self._found[relation]
+
+
+def get_viewer(request):
+    """Viewer текущего пользователя или None для анонимного запроса.
+    Хранится на HttpRequest, поэтому общий для всех сериализаторов
+    ответа, в том числе вложенных.
+    """
+    if request is None or not request.user.is_authenticated:
+        return None
+    http_request = getattr(request, "_request", request)
+    viewer = getattr(http_request, REQUEST_ATTR, None)
+    if viewer is None or viewer.user.pk != request.user.pk:
+        viewer = Viewer(request.user)
+        setattr(http_request, REQUEST_ATTR, viewer)
+    return viewer
+
+
+def sibling_pks(serializer, obj) -> list:
+    """id объектов, которые сериализуются вместе с obj: страница
+    списка или, для вложенного сериализатора, соответствующие объекты
+    каждого элемента страницы. Без списка - только obj.pk."""
+    attrs = []
+    node = serializer
+    while node.parent is not None and not isinstance(
+        node.parent, ListSerializer
+    ):
+        attrs = node.source_attrs + attrs
+        node = node.parent
+    items = node.parent.instance if node.parent is not None else None
+    if not isinstance(items, (list, tuple)):
+        return [obj.pk]
+    for attr in attrs:
+        items = [getattr(item, attr, None) for item in items]
+    return [item.pk for item in items if item is not None]
@@ -1,48 +1,126 @@
+import csv
+import hashlib
+import json
+import re
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
-from django.db.models import Sum
-from django.http import HttpResponse, HttpResponseRedirect
-from django.shortcuts import get_object_or_404, redirect
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Sum
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
-from rest_framework.decorators import action, api_view
-from rest_framework.permissions import SAFE_METHODS, AllowAny
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.status import (
     HTTP_400_BAD_REQUEST,
     HTTP_204_NO_CONTENT,
-    HTTP_200_OK
+    HTTP_200_OK,
+    HTTP_202_ACCEPTED,
+    HTTP_304_NOT_MODIFIED,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.catalog import get_catalog, search_fuzzy
+from api.filters import RecipeFilter
 from api.pagination import LimitPagination
+from api.pdf import render_shopping_list
 from api.permissions import IsAuthorAdminOrReadOnly
+from api.renderers import SHOPPING_LIST_RENDERERS
 from api.serializers import (
     FavoritesSerializer,
     IngredientSerializer,
     RecipeCreateUpdateDeleteSerializer,
+    RecipeIdsSerializer,
     RecipeIngredient,
     RecipeSerializer,
     ShoppingCartSerializer,
     ShortLinkSerializer,
     TagSerializer,
 )
-from recipe.models import Ingredient, Link, Recipe, Tag
+from foodgram import workers
+from foodgram.cache import bump_version, user_namespace
+from recipe import counters
+from recipe.links import resolve_short_code
+from recipe.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
 
 User = get_user_model()
 
+ACCEPTS_GZIP_RE = re.compile(r"\bgzip\b")
+# Сколько раз пакетное добавление перечитывает состояние после
+# конфликта с параллельным запросом.
+BULK_ADD_ATTEMPTS = 3
+
 
 class IngredientListDetailViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet для получение списка ингредиентов или одного ингредиента по id.
-    Возможен поиск по имени.
+    Возможен поиск по началу имени (?name=), он выполняется по каталогу
+    в памяти процесса без запросов к БД. С ?fuzzy=1 поиск устойчив
+    к опечаткам. Полный список отдается заранее подготовленными
+    байтами (в том числе сжатыми gzip) с ETag.
     """
 
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
-    filter_backends = (IngredientFilter,)
-    search_fields = ("^name",)
     permission_classes = (AllowAny,)
     pagination_class = None
+    search_param = "name"
+
+    def list(self, request, *args, **kwargs) -> Response:
+        name = request.query_params.get(self.search_param)
+        if not name:
+            return self.full_catalog(request)
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if request.query_params.get("fuzzy") in ("1", "true"):
+            return Response(search_fuzzy(name, limit))
+        return Response(get_catalog().search_prefix(name, limit))
+
+    @staticmethod
+    def full_catalog(request) -> HttpResponse:
+        catalog = get_catalog()
+        response = get_conditional_response(request, etag=catalog.etag)
+        if response is None:
+            if ACCEPTS_GZIP_RE.search(
+                request.META.get("HTTP_ACCEPT_ENCODING", "")
+            ):
+                response = HttpResponse(
+                    catalog.gzip_body, content_type="application/json"
+                )
+                response["Content-Encoding"] = "gzip"
+            else:
+                response = HttpResponse(
+                    catalog.body, content_type="application/json"
+                )
+        response["ETag"] = catalog.etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        patch_cache_control(
+            response, public=True, max_age=settings.INGREDIENT_CATALOG_MAX_AGE
+        )
+        return response
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -65,14 +143,60 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorAdminOrReadOnly,)
+    lookup_value_regex = r"\d+"
+    ordering_fields = ("pub_date", "favorites_count", "in_carts_count")
+
+    @property
+    def cursor_ordering(self) -> tuple:
+        """Сортировка списка по ?ordering=[-]поле из ordering_fields,
+        по умолчанию новые рецепты первыми. Последним полем идет id,
+        поэтому сортировка годится и для keyset-пагинации."""
+        ordering = self.request.query_params.get("ordering", "")
+        if ordering.lstrip("-") not in self.ordering_fields:
+            return ("-pub_date", "-id")
+        return (ordering, "-id" if ordering.startswith("-") else "id")
+
+    def get_queryset(self):
+        """Для чтения подгружает связи заранее, чтобы число запросов
+        не зависело от размера страницы. Флаги избранного, покупок
+        и подписки берутся из api.viewer."""
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        return queryset.prefetch_related(
+            "author",
+            "tags",
+            Prefetch(
+                "recipeingredient_set",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+        ).order_by(*self.cursor_ordering)
+
+    def get_count_cache_scope(self) -> list[str]:
+        """Версии данных, от которых зависит количество рецептов."""
+        scope = ["recipes"]
+        params = self.request.query_params
+        if self.request.user.is_authenticated and (
+            "is_favorited" in params or "is_in_shopping_cart" in params
+        ):
+            scope.append(user_namespace(self.request.user.id))
+        return scope
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
         return RecipeCreateUpdateDeleteSerializer
 
+    def perform_destroy(self, instance):
+        """Счетчики авторов и пользователей обновляются пачкой
+        после каскадного удаления, а не UPDATE на каждую связь."""
+        with transaction.atomic(), counters.deferred():
+            instance.delete()
+
     def __add__recipe(self, request, pk: int, serializer_class) -> Response:
         """Добавление рецептов в список покупок | избранное.
+        Повторное добавление отсекает уникальный индекс (user, recipe),
+        а не предварительная проверка, поэтому гонки не дают дублей.
         Args:
             request: Request.
             pk (int): id рецепта.
@@ -80,16 +204,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Returns:
             Response: статус рецепта.
         """
-        serializer = serializer_class(
-            data={"user": request.user.id, "recipe": pk},
-            context={"request": request},
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        model = serializer_class.Meta.model
+        recipe = Recipe.objects.filter(pk=pk).only(
+            "id", "name", "image", "cooking_time"
+        ).first()
+        if recipe is None:
+            raise ValidationError(
+                {
+                    "recipe": [
+                        PrimaryKeyRelatedField.default_error_messages[
+                            "does_not_exist"
+                        ].format(pk_value=pk)
+                    ]
+                }
+            )
+        try:
+            with transaction.atomic():
+                instance = model.objects.create(
+                    user=request.user, recipe=recipe
+                )
+        except IntegrityError:
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    serializer_class.duplicate_message
+                ]}
+            )
+        bump_version(user_namespace(request.user.id))
+        if model is ShoppingCart:
+            ShoppingCart.bump_version(pk=request.user.id)
+        serializer = serializer_class(instance, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def __delete_recipe(self, request, pk: int, related_name: str):
         """Удаление рецептов из списка покупок | избранного.
+        Удаляется одним DELETE по ключу (user, recipe), наличие рецепта
+        проверяется только если удалять было нечего.
         Args:
             request: Request.
             pk (int): id рецепта.
@@ -97,10 +246,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Returns:
             Response: статус рецепта.
         """
-        recipe = get_object_or_404(Recipe, id=pk)
         cur_recipe_deleted, _ = (
-            getattr(request.user, related_name).filter(recipe=recipe).delete()
+            getattr(request.user, related_name).filter(recipe_id=pk).delete()
         )
+        if cur_recipe_deleted:
+            bump_version(user_namespace(request.user.id))
+            if related_name == "shopping_cart":
+                ShoppingCart.bump_version(pk=request.user.id)
+        elif not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
         return (
             Response(
                 "Рецепт отсутствует в списке.",
@@ -150,34 +304,313 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """ """"""
         return self.__delete_recipe(request, pk, "shopping_cart")
 
-    @action(detail=False, methods=["get"], url_path="download_shopping_cart")
-    def download_shopping_cart(self, request) -> HttpResponse:
+    def __bulk_add(self, request, model) -> Response:
+        """Пакетное добавление рецептов одним INSERT.
+        Args:
+            request: Request.
+            model: Favorite | ShoppingCart.
+        Returns:
+            Response: статус по каждому id (created, exists, not_found).
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
+        for attempt in range(BULK_ADD_ATTEMPTS):
+            found = set(
+                Recipe.objects.filter(id__in=recipe_ids).values_list(
+                    "id", flat=True
+                )
+            )
+            existing = set(
+                model.objects.filter(
+                    user=request.user, recipe_id__in=found
+                ).values_list("recipe_id", flat=True)
+            )
+            new_ids = [pk for pk in recipe_ids if pk in found - existing]
+            if not new_ids:
+                break
+            objs = [model(user=request.user, recipe_id=pk) for pk in new_ids]
+            # Без ignore_conflicts: успешный INSERT значит, что вставлены
+            # ровно эти строки, и счетчики и ответ им соответствуют.
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(objs)
+                    counters.track_many(objs, 1)
+            except IntegrityError:
+                # Параллельный запрос добавил или удалил часть рецептов.
+                if attempt == BULK_ADD_ATTEMPTS - 1:
+                    raise
+                continue
+            bump_version(user_namespace(request.user.id))
+            if model is ShoppingCart:
+                ShoppingCart.bump_version(pk=request.user.id)
+            break
+        results = [
+            {
+                "id": pk,
+                "status": (
+                    "not_found" if pk not in found
+                    else "exists" if pk in existing
+                    else "created"
+                ),
+            }
+            for pk in recipe_ids
+        ]
+        return Response(
+            {"results": results},
+            status=status.HTTP_201_CREATED if new_ids else HTTP_200_OK,
+        )
+
+    def __bulk_delete(self, request, model) -> Response:
+        """Пакетное удаление рецептов одним DELETE.
+        Args:
+            request: Request.
+            model: Favorite | ShoppingCart.
+        Returns:
+            Response: статус по каждому id (deleted, absent).
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
+        queryset = model.objects.filter(
+            user=request.user, recipe_id__in=recipe_ids
+        )
+        present = set(queryset.values_list("recipe_id", flat=True))
+        if present:
+            with transaction.atomic(), counters.deferred():
+                queryset.delete()
+            bump_version(user_namespace(request.user.id))
+            if model is ShoppingCart:
+                ShoppingCart.bump_version(pk=request.user.id)
+        return Response(
+            {
+                "results": [
+                    {
+                        "id": pk,
+                        "status": "deleted" if pk in present else "absent",
+                    }
+                    for pk in recipe_ids
+                ]
+            },
+            status=HTTP_200_OK,
+        )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="favorite/bulk",
+        url_name="favorite-bulk",
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_bulk(self, request) -> Response:
+        """Добавление в избранное списка рецептов {"recipes": [id, ...]}.
+        Args:
+            request: Request.
+        Returns: статус по каждому рецепту.
+        """
+        return self.__bulk_add(request, Favorite)
+
+    @favorite_bulk.mapping.delete
+    def delete_favorite_bulk(self, request) -> Response:
+        """Удаление из избранного списка рецептов {"recipes": [id, ...]}.
+        Args:
+            request: Request.
+        Returns: статус по каждому рецепту.
+        """
+        return self.__bulk_delete(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="shopping_cart/bulk",
+        url_name="shopping-cart-bulk",
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request) -> Response:
+        """Добавление в список покупок списка рецептов.
+        Args:
+            request: Request.
+        Returns: статус по каждому рецепту.
+        """
+        return self.__bulk_add(request, ShoppingCart)
+
+    @shopping_cart_bulk.mapping.delete
+    def delete_shopping_cart_bulk(self, request) -> Response:
+        """Удаление из списка покупок списка рецептов.
+        Args:
+            request: Request.
+        Returns: статус по каждому рецепту.
+        """
+        return self.__bulk_delete(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=["delete"],
+        url_path="shopping_cart",
+        url_name="shopping-cart-clear",
+        permission_classes=(IsAuthenticated,),
+    )
+    def clear_shopping_cart(self, request) -> Response:
+        """Очистка списка покупок одним DELETE.
+        Args:
+            request: Request.
+        Returns: 204.
+        """
+        with transaction.atomic(), counters.deferred():
+            deleted, _ = request.user.shopping_cart.all().delete()
+        if deleted:
+            bump_version(user_namespace(request.user.id))
+            ShoppingCart.bump_version(pk=request.user.id)
+        return Response(status=HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="download_shopping_cart",
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+    )
+    def download_shopping_cart(self, request) -> StreamingHttpResponse:
         """Скачивает файл со списком покупок.
         Считает сумму ингредиентов в рецептах.
+        Формат выбирается через ?format=txt|csv|json|pdf (по умолчанию
+        txt). ETag зависит от версии списка покупок пользователя, поэтому
+        повторное скачивание неизмененного списка отдает 304.
+        PDF рендерится в пуле процессов: если файла еще нет в кэше,
+        возвращается 202 с адресом для повторного запроса.
         Args:
             request: Request.
         Returns:
-            HttpResponse: файл со списком ингредиентов в нужном формате.
+            StreamingHttpResponse: файл со списком ингредиентов.
         """
         user = request.user
-        ingredients = (
-            RecipeIngredient.objects.filter(recipe__shopping_cart__user=user)
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(amount=Sum("amount"))
+        renderer = request.accepted_renderer
+        version = (
+            User.objects.filter(pk=user.pk)
+            .values_list("shopping_cart_version", flat=True)
+            .get()
         )
-        shopping_list = "Список покупок\n"
+        etag = f'"{user.pk}-{version}-{renderer.format}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            ingredients = (
+                RecipeIngredient.objects.filter(
+                    recipe__shopping_cart__user=user
+                )
+                .values("ingredient__name", "ingredient__measurement_unit")
+                .annotate(amount=Sum("amount"))
+                .order_by("ingredient__name", "ingredient__measurement_unit")
+            )
+            filename = f"{user.username}_shopping_list.{renderer.format}"
+            if renderer.format == "pdf":
+                response = self._shopping_list_pdf(
+                    request, ingredients, filename
+                )
+            else:
+                writer = getattr(self, f"_shopping_list_{renderer.format}")
+                response = StreamingHttpResponse(
+                    writer(ingredients.iterator()),
+                    content_type=f"{renderer.media_type}; charset=utf-8",
+                )
+                response[
+                    "Content-Disposition"
+                ] = f"attachment; filename={filename}"
+        if response.status_code in (HTTP_200_OK, HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def _shopping_list_pdf(request, ingredients, filename: str):
+        """Отдает PDF из дискового кэша по хэшу содержимого списка
+        или ставит рендеринг в пул. Одинаковые списки разных
+        пользователей используют один файл."""
+        rows = [
+            (
+                ingredient["ingredient__name"],
+                ingredient["ingredient__measurement_unit"],
+                ingredient["amount"],
+            )
+            for ingredient in ingredients
+        ]
+        digest = hashlib.sha256(
+            json.dumps(rows, ensure_ascii=False).encode()
+        ).hexdigest()
+        path = settings.SHOPPING_LIST_PDF_DIR / f"{digest}.pdf"
+        if path.exists():
+            return FileResponse(
+                open(path, "rb"),
+                as_attachment=True,
+                filename=filename,
+                content_type="application/pdf",
+            )
+        poll_url = request.build_absolute_uri()
+        try:
+            workers.submit(
+                f"shopping-list:{digest}",
+                render_shopping_list,
+                rows,
+                str(path),
+                settings.SHOPPING_LIST_PDF_FONT,
+                "Список покупок",
+            )
+        except workers.PoolBusy:
+            response = JsonResponse(
+                {"detail": "Сервис занят, повторите запрос позже."},
+                status=HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        else:
+            response = JsonResponse(
+                {"detail": "Список покупок готовится.", "url": poll_url},
+                status=HTTP_202_ACCEPTED,
+            )
+            response["Location"] = poll_url
+        response["Retry-After"] = "1"
+        return response
+
+    @staticmethod
+    def _shopping_list_txt(ingredients):
+        yield "Список покупок\n"
         for ingredient in ingredients:
-            shopping_list += "".join(
+            yield (
                 f'- {ingredient["ingredient__name"]} '
                 f'({ingredient["ingredient__measurement_unit"]})'
                 f' - {ingredient["amount"]}\n'
             )
-        filename = f"{user.username}_shopping_list.txt"
-        response = HttpResponse(shopping_list, content_type="text/plain")
-        response[
-            "Content-Disposition"
-        ] = f"attachment; filename={filename}.txt"
-        return response
+
+    @staticmethod
+    def _shopping_list_csv(ingredients):
+        class Line:
+            def write(self, value):
+                return value
+
+        writer = csv.writer(Line())
+        yield writer.writerow(("name", "measurement_unit", "amount"))
+        for ingredient in ingredients:
+            yield writer.writerow(
+                (
+                    ingredient["ingredient__name"],
+                    ingredient["ingredient__measurement_unit"],
+                    ingredient["amount"],
+                )
+            )
+
+    @staticmethod
+    def _shopping_list_json(ingredients):
+        separator = "["
+        for ingredient in ingredients:
+            yield separator + json.dumps(
+                {
+                    "name": ingredient["ingredient__name"],
+                    "measurement_unit": ingredient[
+                        "ingredient__measurement_unit"
+                    ],
+                    "amount": ingredient["amount"],
+                },
+                ensure_ascii=False,
+            )
+            separator = ","
+        yield "[]" if separator == "[" else "]"
 
     @action(detail=True, methods=["get"], url_path="get-link")
     def get_short_link(self, request, pk: int) -> Response:
@@ -197,14 +630,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=HTTP_200_OK)
 
 
-@api_view(["GET"])
+@require_safe
 def redirect_to_recipe(request, short_code) -> HttpResponseRedirect:
     """При переходе по короткой ссылке перенаправляет на страницу рецепта.
+    Обычный Django view без обработки DRF: ссылка берется из кэша,
+    см. recipe.links.
     Args:
-        request: Request.
+        request: HttpRequest.
         short_code (str): короткий slug для репепта.
     Returns:
         HttpResponseRedirect: полная сслыка на репепт.
     """
-    link = get_object_or_404(Link, short_code=short_code)
-    return redirect(link.original_link)
+    original_link = resolve_short_code(short_code)
+    if original_link is None:
+        raise Http404("Ссылка не найдена.")
+    return HttpResponseRedirect(original_link)
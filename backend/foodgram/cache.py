@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+VERSION_KEY = "version:{}"
+
+
+def get_version(namespace: str) -> int:
+    """Текущая версия пространства имен кэша."""
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(*namespaces: str) -> None:
+    """Инвалидирует все ключи, построенные на версиях namespaces."""
+    for namespace in namespaces:
+        key = VERSION_KEY.format(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 2, timeout=None)
+
+
+def cache_is_shared() -> bool:
+    """Видят ли все воркеры одни и те же записи кэша по умолчанию.
+    У LocMemCache в каждом процессе свои данные, и удаление записи
+    в одном воркере до остальных не доходит."""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def user_namespace(user_id: int) -> str:
+    """Пространство имен избранного, покупок и подписок пользователя."""
+    return f"user:{user_id}"
+
+
+class LocalCache:
+    """Ограниченный LRU-кэш в памяти процесса с временем жизни записей.
+
+    Изменения в других процессах до него не доходят, поэтому timeout
+    задает, сколько устаревшее значение может жить в этом воркере.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -8,3 +8,5 @@ MIN_TIME = MIN_AMOUNT = 1
 MAX_TIME = MAX_AMOUNT = 32000
 
 PAGE_SIZE = 16
+MAX_PAGE_SIZE = 100
+BULK_MAX_RECIPES = 100
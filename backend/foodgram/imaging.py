@@ -0,0 +1,53 @@
+"""Построение уменьшенных копий изображений.
+
+Выполняется в процессах пула foodgram.workers, поэтому модуль
+не импортирует Django.
+"""
+import os
+
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    "WEBP": {"quality": 80, "method": 4},
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+}
+
+
+def render_variants(source: str, targets) -> list[str]:
+    """Сохраняет копии source по списку targets.
+    Args:
+        source (str): путь к исходному файлу.
+        targets: кортежи (path, size, crop, format): crop=True обрезает
+            изображение под размер, иначе оно вписывается в него.
+    Returns:
+        list[str]: пути созданных файлов.
+    """
+    largest = (
+        max(size[0] for _, size, _, _ in targets),
+        max(size[1] for _, size, _, _ in targets),
+    )
+    with Image.open(source) as image:
+        # Для JPEG декодируется сразу уменьшенная версия.
+        image.draft("RGB", largest)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert(
+                "RGBA" if image.has_transparency_data else "RGB"
+            )
+        created = []
+        for path, size, crop, image_format in targets:
+            if crop:
+                variant = ImageOps.fit(image, size, Image.LANCZOS)
+            else:
+                variant = image.copy()
+                variant.thumbnail(size, Image.LANCZOS)
+            if image_format == "JPEG" and variant.mode != "RGB":
+                background = Image.new("RGB", variant.size, "white")
+                background.paste(variant, mask=variant.getchannel("A"))
+                variant = background
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            variant.save(tmp_path, image_format, **SAVE_OPTIONS[image_format])
+            os.replace(tmp_path, path)
+            created.append(path)
+    return created
@@ -0,0 +1,28 @@
+class UpdateOnlyFieldsMixin:
+    """Модель, часть полей которой меняется только через
+    QuerySet.update() с F() (счетчики, версии).
+
+    save() существующего объекта без update_fields не записывает эти
+    поля, иначе значения, прочитанные до параллельного инкремента,
+    затерли бы его. Не загруженные (отложенные) поля тоже
+    не записываются, как в обычном Model.save().
+    """
+
+    update_only_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and not self._state.adding
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.update_only_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
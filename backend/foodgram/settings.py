@@ -132,16 +132,96 @@ STATIC_ROOT = BASE_DIR / "backend_static/static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+STORAGES = {
+    "default": {"BACKEND": "foodgram.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "foodgram"),
+    }
+}
+
+# Сколько секунд количество объектов в пагинации может быть устаревшим.
+PAGINATION_COUNT_TIMEOUT = int(os.getenv("PAGINATION_COUNT_TIMEOUT", 60))
+# Оценка планировщика PostgreSQL вместо COUNT(*) для списков без фильтров.
+PAGINATION_COUNT_ESTIMATE = (
+    os.getenv("PAGINATION_COUNT_ESTIMATE", "False").lower() == "true"
+)
+PAGINATION_COUNT_ESTIMATE_MIN = int(
+    os.getenv("PAGINATION_COUNT_ESTIMATE_MIN", 100000)
+)
+
+# Поиск ингредиентов по каталогу в памяти процесса.
+INGREDIENT_SEARCH_LIMIT = int(os.getenv("INGREDIENT_SEARCH_LIMIT", 50))
+INGREDIENT_CATALOG_TTL = int(os.getenv("INGREDIENT_CATALOG_TTL", 300))
+# Сколько секунд клиент может не перепроверять полный список ингредиентов.
+INGREDIENT_CATALOG_MAX_AGE = int(os.getenv("INGREDIENT_CATALOG_MAX_AGE", 60))
+# auto - pg_trgm на PostgreSQL при наличии расширения, python - в памяти.
+INGREDIENT_FUZZY_BACKEND = os.getenv("INGREDIENT_FUZZY_BACKEND", "auto")
+INGREDIENT_FUZZY_THRESHOLD = float(
+    os.getenv("INGREDIENT_FUZZY_THRESHOLD", 0.3)
+)
+
+# Ограничения на загружаемые изображения (рецепты, аватары).
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 40_000_000))
+# Память о готовых уменьшенных копиях, чтобы не проверять файлы
+# на каждый ответ.
+IMAGE_VARIANTS_CACHE_SIZE = int(os.getenv("IMAGE_VARIANTS_CACHE_SIZE", 50000))
+IMAGE_VARIANTS_CACHE_TIMEOUT = int(
+    os.getenv("IMAGE_VARIANTS_CACHE_TIMEOUT", 3600)
+)
+
+# Кэш коротких ссылок: LRU в каждом воркере и общий кэш (только
+# с межпроцессным CACHE_BACKEND). Для неизвестных кодов кэшируется
+# отрицательный ответ. Изменение ссылки доходит до LRU других воркеров
+# через SHORT_LINK_LOCAL_TIMEOUT (SHORT_LINK_NEGATIVE_TIMEOUT).
+SHORT_LINK_LOCAL_SIZE = int(os.getenv("SHORT_LINK_LOCAL_SIZE", 10000))
+SHORT_LINK_LOCAL_TIMEOUT = int(os.getenv("SHORT_LINK_LOCAL_TIMEOUT", 60))
+SHORT_LINK_CACHE_TIMEOUT = int(os.getenv("SHORT_LINK_CACHE_TIMEOUT", 3600))
+SHORT_LINK_NEGATIVE_TIMEOUT = int(
+    os.getenv("SHORT_LINK_NEGATIVE_TIMEOUT", 60)
+)
+
+# Кэш пользователей по токену: общий кэш и, если задан таймаут, LRU
+# в каждом воркере. Общий уровень работает только с межпроцессным
+# CACHE_BACKEND (Redis, Memcached, БД), с LocMemCache он выключен.
+# Отзыв токена доходит до LRU других воркеров только по истечении
+# TOKEN_AUTH_LOCAL_TIMEOUT, поэтому по умолчанию LRU выключен.
+TOKEN_AUTH_CACHE_TIMEOUT = int(os.getenv("TOKEN_AUTH_CACHE_TIMEOUT", 300))
+TOKEN_AUTH_LOCAL_SIZE = int(os.getenv("TOKEN_AUTH_LOCAL_SIZE", 10000))
+TOKEN_AUTH_LOCAL_TIMEOUT = int(os.getenv("TOKEN_AUTH_LOCAL_TIMEOUT", 0))
+
+# Пул процессов для тяжелых задач (PDF, обработка изображений).
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", 2))
+WORKER_QUEUE_LIMIT = int(os.getenv("WORKER_QUEUE_LIMIT", 32))
+
+# Кэш готовых PDF. В контейнере каталог должен быть томом, чтобы
+# переживать перезапуск; старые файлы удаляет gc_media --pdf-max-age.
+SHOPPING_LIST_PDF_DIR = Path(
+    os.getenv("SHOPPING_LIST_PDF_DIR", BASE_DIR / "shopping_lists")
+)
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    "SHOPPING_LIST_PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+)
+
 
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
 }
 
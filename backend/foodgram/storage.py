@@ -0,0 +1,90 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Файлы в каталогах HASHED_DIRS (recipes/, avatars/) получают имя
+из sha256 содержимого: повторная загрузка того же изображения
+не пишет новый файл, а ссылается на существующий. Содержимое по
+имени никогда не меняется, поэтому nginx отдает /media/ с
+Cache-Control: immutable. Один файл может принадлежать нескольким
+строкам, поэтому delete() их не удаляет: осиротевшие файлы убирает
+команда gc_media.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASHED_DIRS = ("recipes", "avatars")
+
+
+def file_sha256(file) -> str:
+    """sha256 содержимого файла; позиция чтения возвращается в начало."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed(name: str) -> bool:
+    return posixpath.dirname(name) in HASHED_DIRS
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который называет файлы по содержимому."""
+
+    def save(self, name, content, max_length=None):
+        if name is not None and is_hashed(name):
+            if not hasattr(content, "chunks"):
+                content = File(content, name)
+            directory, filename = posixpath.split(name)
+            extension = posixpath.splitext(filename)[1].lower()
+            name = posixpath.join(
+                directory, f"{file_sha256(content)}{extension}"
+            )
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        if is_hashed(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def delete(self, name):
+        """Файл по содержимому может быть общим для нескольких строк,
+        поэтому на месте не удаляется: осиротевшие файлы убирает
+        gc_media."""
+        if name and is_hashed(name):
+            return
+        super().delete(name)
+
+    def _save(self, name, content):
+        if not is_hashed(name):
+            return super()._save(name, content)
+        full_path = self.path(name)
+        try:
+            # Повторная загрузка обновляет mtime: gc_media не удаляет
+            # файлы моложе --grace, даже если строка еще не закоммичена.
+            os.utime(full_path)
+        except FileNotFoundError:
+            pass
+        else:
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Запись во временный файл и переименование: параллельная
+        # загрузка того же содержимого просто заменит файл таким же.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
@@ -0,0 +1,116 @@
+"""Уменьшенные копии загруженных изображений.
+
+После сохранения рецепта или аватара копии строятся в пуле процессов
+(foodgram.workers). Имя копии выводится из имени оригинала:
+recipes/abc.png -> recipes/variants/abc_card.webp, поэтому адреса
+вычисляются без запросов к БД. Пока копии нет, сериализаторы
+отдают вместо нее null, и клиент берет оригинал.
+"""
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from foodgram import workers
+from foodgram.cache import LocalCache
+from foodgram.imaging import render_variants
+
+logger = logging.getLogger(__name__)
+
+# Имя: (размер, обрезать под размер).
+VARIANTS = {
+    "recipes": {
+        "card": ((480, 360), True),
+        "detail": ((1200, 900), False),
+    },
+    "avatars": {
+        "avatar": ((160, 160), True),
+    },
+}
+FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+_existing = LocalCache(settings.IMAGE_VARIANTS_CACHE_SIZE)
+
+
+def variant_name(name: str, variant: str, extension: str) -> str:
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, "variants", f"{stem}_{variant}.{extension}"
+    )
+
+
+def variant_specs(name: str) -> dict:
+    return VARIANTS.get(posixpath.dirname(name).split("/")[0], {})
+
+
+def render_targets(name: str, storage=default_storage):
+    """Аргументы render_variants() для файла name или None,
+    если копии для него не нужны или хранилище не локальное."""
+    specs = variant_specs(name)
+    if not specs:
+        return None
+    try:
+        return storage.path(name), [
+            (storage.path(variant_name(name, variant, extension)), size,
+             crop, image_format)
+            for variant, (size, crop) in specs.items()
+            for extension, image_format in FORMATS.items()
+        ]
+    except NotImplementedError:
+        return None
+
+
+def schedule(field_file) -> None:
+    """Ставит в пул построение всех копий для файла, если их нет."""
+    if not field_file or variant_urls(field_file) is not None:
+        return
+    name = field_file.name
+    args = render_targets(name, field_file.storage)
+    if args is None:
+        return
+    source, targets = args
+    try:
+        workers.submit(f"variants:{name}", render_variants, source, targets)
+    except workers.PoolBusy:
+        logger.warning("Пул занят, копии %s не построены", name)
+
+
+def variant_urls(field_file, request=None):
+    """Адреса готовых копий {вариант: {расширение: url}} или None,
+    если копии еще не построены."""
+    if not field_file:
+        return None
+    name = field_file.name
+    specs = variant_specs(name)
+    if not specs:
+        return None
+    storage = getattr(field_file, "storage", default_storage)
+    result = {}
+    for variant in specs:
+        urls = {}
+        for extension in FORMATS:
+            path = variant_name(name, variant, extension)
+            if not _existing.get(path):
+                if not storage.exists(path):
+                    return None
+                _existing.set(path, True, settings.IMAGE_VARIANTS_CACHE_TIMEOUT)
+            url = storage.url(path)
+            urls[extension] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        result[variant] = urls
+    return result
+
+
+def schedule_on_commit(field_file, update_fields=None) -> None:
+    """Для сигнала post_save: копии строятся после коммита и только
+    если файл мог измениться."""
+    if not field_file or (
+        update_fields is not None
+        and field_file.field.name not in update_fields
+    ):
+        return
+    transaction.on_commit(lambda: schedule(field_file))
@@ -0,0 +1,70 @@
+"""Пул процессов для тяжелой работы вне потока запроса.
+
+Пул создается лениво, по одному на процесс веб-сервера. Задачи с
+одинаковым ключом, пока выполняются, объединяются в одну.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending: dict[str, Future] = {}
+_lock = threading.RLock()
+
+
+class PoolBusy(Exception):
+    """Очередь пула заполнена."""
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.WORKER_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def submit(key: str, fn, *args) -> Future:
+    """Ставит fn(*args) в пул или возвращает уже запущенную задачу
+    с тем же ключом. Функция и аргументы должны сериализоваться pickle,
+    а модуль функции - импортироваться без настройки Django.
+    """
+    with _lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        if len(_pending) >= settings.WORKER_QUEUE_LIMIT:
+            raise PoolBusy
+        try:
+            future = get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            _reset_executor()
+            future = get_executor().submit(fn, *args)
+        _pending[key] = future
+    future.add_done_callback(lambda done: _finish(key, done))
+    return future
+
+
+def _finish(key: str, future: Future) -> None:
+    with _lock:
+        _pending.pop(key, None)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Задача %s завершилась ошибкой", key,
+                     exc_info=future.exception())
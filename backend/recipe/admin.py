@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db import transaction
 
+from recipe import counters
 from recipe.models import (
     Favorite,
     Ingredient,
@@ -30,6 +32,7 @@ class RecipeAdmin(admin.ModelAdmin):
         "pub_date",
         "get_tag",
         "cnt_favoties",
+        "in_carts_count",
     )
     list_editable = (
         "name",
@@ -46,9 +49,23 @@ class RecipeAdmin(admin.ModelAdmin):
     def get_tag(self, obj):
         return ", ".join(tag.name for tag in obj.tags.all())
 
-    @admin.display(description="Количество в избранном")
+    @admin.display(
+        description="Количество в избранном", ordering="favorites_count"
+    )
     def cnt_favoties(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        with ShoppingCart.deferred_versions():
+            super().save_related(request, form, formsets, change)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic(), counters.deferred():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic(), counters.deferred():
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(Favorite)
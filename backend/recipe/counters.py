@@ -0,0 +1,216 @@
+"""Денормализованные счетчики связей.
+
+Каждый счетчик - столбец модели-владельца, равный числу строк
+модели-связи с ее id в поле key: например, Recipe.favorites_count -
+число Favorite с этим recipe_id.
+
+Сигналы recipe.signals меняют счетчики атомарным UPDATE ... SET
+field = field + delta при сохранении и удалении связей, в том числе
+каскадном, и при смене владельца у существующей связи (track_moves(),
+например смена автора рецепта в админке). bulk_create сигналов
+не вызывает, поэтому после него вызывается track_many(). Внутри deferred() изменения копятся
+и применяются одним UPDATE на (счетчик, delta) при выходе из блока,
+а счетчики владельцев, удаленных в том же блоке (forget_owner()),
+не обновляются вовсе. Поэтому каскадное удаление рецепта или
+пользователя стоит выполнять внутри deferred().
+Расхождения после QuerySet.update() или правок напрямую в БД
+исправляет reconcile() (команда reconcile_counters).
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from recipe.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class CounterField(NamedTuple):
+    model: type
+    field: str
+    relation: type
+    key: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.model._meta.label}.{self.field}"
+
+
+COUNTERS = (
+    CounterField(Recipe, "favorites_count", Favorite, "recipe_id"),
+    CounterField(Recipe, "in_carts_count", ShoppingCart, "recipe_id"),
+    CounterField(User, "recipes_count", Recipe, "author_id"),
+    CounterField(User, "followers_count", Subscription, "following_id"),
+    CounterField(User, "following_count", Subscription, "user_id"),
+)
+
+UPDATE_BATCH_SIZE = 1000
+
+_state = threading.local()
+
+
+def apply(changes, deleted=None) -> None:
+    """Применяет {counter: Counter({pk: delta})}: один UPDATE
+    на каждое значение delta (и каждые UPDATE_BATCH_SIZE id).
+    Владельцы из deleted ({model: {pk}}) пропускаются."""
+    for counter, deltas in changes.items():
+        skip = deleted.get(counter.model, ()) if deleted else ()
+        by_delta = defaultdict(list)
+        for pk, delta in deltas.items():
+            if delta and pk not in skip:
+                by_delta[delta].append(pk)
+        for delta, pks in by_delta.items():
+            value = F(counter.field) + delta
+            if delta < 0:
+                value = Greatest(value, 0)
+            for start in range(0, len(pks), UPDATE_BATCH_SIZE):
+                counter.model.objects.filter(
+                    pk__in=pks[start:start + UPDATE_BATCH_SIZE]
+                ).update(**{counter.field: value})
+
+
+@contextmanager
+def deferred():
+    """Копит изменения счетчиков до конца блока. Вложенные блоки
+    присоединяются к внешнему. Изменения применяются только при
+    успешном выходе, поэтому блок стоит держать внутри
+    transaction.atomic()."""
+    if getattr(_state, "pending", None) is not None:
+        yield
+        return
+    _state.pending = defaultdict(Counter)
+    _state.deleted = defaultdict(set)
+    try:
+        yield
+        pending, deleted = _state.pending, _state.deleted
+    finally:
+        _state.pending = _state.deleted = None
+    apply(pending, deleted)
+
+
+def forget_owner(obj) -> None:
+    """Отмечает удаленного владельца счетчиков: внутри deferred()
+    изменения его счетчиков отбрасываются, а не пишутся в строку,
+    которой уже нет."""
+    deleted = getattr(_state, "deleted", None)
+    if deleted is None:
+        return
+    for counter in COUNTERS:
+        if isinstance(obj, counter.model):
+            deleted[counter.model].add(obj.pk)
+
+
+def track_many(objs, delta: int) -> None:
+    """Учитывает добавление (delta=1) или удаление (delta=-1) связей."""
+    changes = defaultdict(Counter)
+    for obj in objs:
+        for counter in COUNTERS:
+            if isinstance(obj, counter.relation):
+                pk = getattr(obj, counter.key)
+                if pk is not None:
+                    changes[counter][pk] += delta
+    record(changes)
+
+
+def track(obj, delta: int) -> None:
+    track_many((obj,), delta)
+
+
+def record(changes) -> None:
+    """Применяет изменения сразу или, внутри deferred(), в конце блока."""
+    pending = getattr(_state, "pending", None)
+    if pending is None:
+        apply(changes)
+        return
+    for counter, deltas in changes.items():
+        pending[counter].update(deltas)
+
+
+def track_moves(obj, update_fields=None):
+    """Изменения счетчиков от смены владельца у сохраняемой связи:
+    -1 прежнему и +1 новому. Вызывается до сохранения, поэтому
+    прежние значения читаются из БД, если поле может меняться.
+    Returns:
+        изменения для record() или None.
+    """
+    if obj._state.adding or obj.pk is None:
+        return None
+    counted = [
+        counter for counter in COUNTERS if isinstance(obj, counter.relation)
+    ]
+    if update_fields is not None:
+        names = {obj._meta.get_field(name).attname for name in update_fields}
+        counted = [counter for counter in counted if counter.key in names]
+    if not counted:
+        return None
+    old = (
+        type(obj)._base_manager.filter(pk=obj.pk)
+        .values(*{counter.key for counter in counted})
+        .first()
+    )
+    if old is None:
+        return None
+    changes = defaultdict(Counter)
+    for counter in counted:
+        before, after = old[counter.key], getattr(obj, counter.key)
+        if before == after:
+            continue
+        if before is not None:
+            changes[counter][before] -= 1
+        if after is not None:
+            changes[counter][after] += 1
+    return changes or None
+
+
+def reconcile(counter: CounterField, pks=None, batch_size: int = 1000):
+    """Пересчитывает counter пачками по batch_size владельцев.
+    Строки пачки блокируются на время пересчета, чтобы не потерять
+    параллельные инкременты.
+    Args:
+        counter (CounterField): счетчик.
+        pks: id владельцев, по умолчанию все.
+        batch_size (int): размер пачки.
+    Returns:
+        tuple[int, int]: проверено и исправлено строк.
+    """
+    queryset = counter.model.objects.order_by("pk")
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    checked = fixed = 0
+    last = None
+    while True:
+        batch = queryset if last is None else queryset.filter(pk__gt=last)
+        with transaction.atomic():
+            current = dict(
+                batch.select_for_update().values_list(
+                    "pk", counter.field
+                )[:batch_size]
+            )
+            if not current:
+                break
+            actual = dict(
+                counter.relation.objects.filter(
+                    **{f"{counter.key}__in": current}
+                )
+                .values(counter.key)
+                .annotate(total=Count("pk"))
+                .values_list(counter.key, "total")
+                .order_by()
+            )
+            wrong = [
+                counter.model(pk=pk, **{counter.field: actual.get(pk, 0)})
+                for pk, value in current.items()
+                if value != actual.get(pk, 0)
+            ]
+            counter.model.objects.bulk_update(wrong, [counter.field])
+        checked += len(current)
+        fixed += len(wrong)
+        last = max(current)
+    return checked, fixed
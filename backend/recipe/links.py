@@ -0,0 +1,61 @@
+"""Разрешение коротких ссылок /s/<short_code>/.
+
+Сначала проверяется LRU текущего процесса, затем общий кэш Django
+и только потом таблица Link. Неизвестный код тоже кэшируется
+(пустой строкой), чтобы перебор кодов не доходил до БД.
+Сигналы Link сбрасывают запись при сохранении и удалении: в общем кэше
+сразу для всех воркеров, в LRU других воркеров запись живет не дольше
+SHORT_LINK_LOCAL_TIMEOUT (SHORT_LINK_NEGATIVE_TIMEOUT для неизвестных
+кодов). С LocMemCache общий уровень не используется: такой кэш у
+каждого воркера свой, и сброс не дошел бы до остальных.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.cache import LocalCache, cache_is_shared
+from recipe.models import Link
+
+CACHE_KEY = "short_link:{}"
+MISSING = ""
+
+_local = LocalCache(settings.SHORT_LINK_LOCAL_SIZE)
+
+
+def resolve_short_code(short_code: str):
+    """Полная ссылка для short_code или None, если кода нет."""
+    if len(short_code) > Link._meta.get_field("short_code").max_length:
+        return None
+    original_link = _local.get(short_code)
+    if original_link is None:
+        key = CACHE_KEY.format(short_code)
+        shared = cache_is_shared()
+        if shared:
+            original_link = cache.get(key)
+        if original_link is None:
+            original_link = (
+                Link.objects.filter(short_code=short_code)
+                .values_list("original_link", flat=True)
+                .first()
+            )
+            if original_link is None:
+                original_link = MISSING
+            if shared:
+                cache.set(
+                    key,
+                    original_link,
+                    settings.SHORT_LINK_NEGATIVE_TIMEOUT
+                    if original_link == MISSING
+                    else settings.SHORT_LINK_CACHE_TIMEOUT,
+                )
+        timeout = (
+            settings.SHORT_LINK_NEGATIVE_TIMEOUT
+            if original_link == MISSING
+            else settings.SHORT_LINK_LOCAL_TIMEOUT
+        )
+        _local.set(short_code, original_link, timeout)
+    return original_link or None
+
+
+def forget_short_code(short_code: str) -> None:
+    _local.delete(short_code)
+    cache.delete(CACHE_KEY.format(short_code))
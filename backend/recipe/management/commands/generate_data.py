@@ -0,0 +1,255 @@
+import itertools
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from foodgram.cache import bump_version
+from recipe import counters
+from recipe.models import (
+    Favorite,
+    Ingredient,
+    Link,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+TAGS = (
+    ("Завтрак", "breakfast"),
+    ("Обед", "lunch"),
+    ("Ужин", "dinner"),
+    ("Десерт", "dessert"),
+    ("Выпечка", "bakery"),
+    ("Суп", "soup"),
+    ("Салат", "salad"),
+    ("Вегетарианское", "vegetarian"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерация синтетических данных для нагрузочных тестов. "
+        "Результат детерминирован значением --seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument("--favorites", type=int, default=50000)
+        parser.add_argument("--carts", type=int, default=20000)
+        parser.add_argument("--subscriptions", type=int, default=5000)
+        parser.add_argument(
+            "--links", type=float, default=0.3,
+            help="Доля рецептов с короткой ссылкой.",
+        )
+        parser.add_argument(
+            "--zipf", type=float, default=1.1,
+            help="Показатель распределения Ципфа для популярности.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.zipf = options["zipf"]
+        self.prefix = f"seed{options['seed']}_"
+        ingredient_ids = list(
+            Ingredient.objects.order_by("id").values_list("id", flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                "Таблица ингредиентов пуста, сначала выполните import_data."
+            )
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                tag_ids = self.create_tags()
+                user_ids = self.create_users(options["users"])
+                recipe_ids = self.create_recipes(
+                    options["recipes"], user_ids, ingredient_ids, tag_ids
+                )
+                self.create_user_recipes(
+                    Favorite, options["favorites"], user_ids, recipe_ids
+                )
+                self.create_user_recipes(
+                    ShoppingCart, options["carts"], user_ids, recipe_ids
+                )
+                self.create_subscriptions(options["subscriptions"], user_ids)
+                self.create_links(options["links"], recipe_ids)
+        except IntegrityError as error:
+            raise CommandError(
+                f"Данные с seed={options['seed']} уже сгенерированы "
+                f"или конфликтуют с существующими: {error}"
+            )
+        bump_version("recipes", "users")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово за {time.monotonic() - started:.1f} с."
+            )
+        )
+
+    def zipf_sampler(self, population: list):
+        """Возвращает функцию выборки k элементов с весами 1 / rank^s.
+        Порядок популярности перемешивается генератором с seed.
+        """
+        ranked = list(population)
+        self.rng.shuffle(ranked)
+        weights = itertools.accumulate(
+            1 / rank ** self.zipf for rank in range(1, len(ranked) + 1)
+        )
+        cum_weights = list(weights)
+
+        def sample(k: int = 1) -> list:
+            return self.rng.choices(ranked, cum_weights=cum_weights, k=k)
+
+        return sample
+
+    def bulk_create(self, model, objs) -> list:
+        """Пакетная вставка с отчетом о скорости и учетом счетчиков."""
+        started = time.monotonic()
+        created = model.objects.bulk_create(objs, batch_size=self.batch_size)
+        counters.track_many(created, 1)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural}: {len(created)} строк, "
+            f"{len(created) / elapsed:.0f} строк/с"
+        )
+        return created
+
+    def create_tags(self) -> list[int]:
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=slug) for name, slug in TAGS],
+            ignore_conflicts=True,
+        )
+        return list(Tag.objects.order_by("id").values_list("id", flat=True))
+
+    def create_users(self, count: int) -> list[int]:
+        password = make_password(f"{self.prefix}password")
+        users = self.bulk_create(
+            User,
+            (
+                User(
+                    email=f"{self.prefix}{i}@example.com",
+                    username=f"{self.prefix}{i}",
+                    first_name=f"Имя{i}",
+                    last_name=f"Фамилия{i}",
+                    password=password,
+                )
+                for i in range(count)
+            ),
+        )
+        return [user.id for user in users]
+
+    def create_recipes(
+        self,
+        count: int,
+        user_ids: list[int],
+        ingredient_ids: list[int],
+        tag_ids: list[int],
+    ) -> list[int]:
+        if not user_ids:
+            return []
+        authors = self.zipf_sampler(user_ids)(count)
+        rng = self.rng
+        recipes = self.bulk_create(
+            Recipe,
+            (
+                Recipe(
+                    author_id=authors[i],
+                    name=f"Рецепт {self.prefix}{i}",
+                    text=f"Описание рецепта {i}.",
+                    cooking_time=rng.randint(5, 180),
+                )
+                for i in range(count)
+            ),
+        )
+        recipe_ids = [recipe.id for recipe in recipes]
+
+        ingredients = self.zipf_sampler(ingredient_ids)
+        recipe_ingredients = []
+        for recipe_id in recipe_ids:
+            for ingredient_id in set(ingredients(rng.randint(3, 12))):
+                recipe_ingredients.append(
+                    RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=rng.choice((1, 2, 5, 10, 50, 100, 200, 500)),
+                    )
+                )
+        self.bulk_create(RecipeIngredient, recipe_ingredients)
+
+        tags = self.zipf_sampler(tag_ids)
+        RecipeTag = Recipe.tags.through
+        self.bulk_create(
+            RecipeTag,
+            [
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in set(tags(rng.randint(1, 3)))
+            ],
+        )
+        return recipe_ids
+
+    def sample_pairs(self, count: int, left: list, right: list) -> set:
+        """Уникальные пары: left равномерно, right по Ципфу."""
+        if not left or not right:
+            return set()
+        count = min(count, len(left) * len(right))
+        right_sample = self.zipf_sampler(right)
+        pairs = set()
+        attempts = count * 10
+        while len(pairs) < count and attempts:
+            batch = count - len(pairs)
+            pairs.update(
+                zip(
+                    self.rng.choices(left, k=batch),
+                    right_sample(batch),
+                )
+            )
+            attempts -= batch
+        return pairs
+
+    def create_user_recipes(self, model, count, user_ids, recipe_ids):
+        pairs = self.sample_pairs(count, user_ids, recipe_ids)
+        self.bulk_create(
+            model,
+            [
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in sorted(pairs)
+            ],
+        )
+
+    def create_subscriptions(self, count, user_ids):
+        pairs = self.sample_pairs(count, user_ids, user_ids)
+        self.bulk_create(
+            Subscription,
+            [
+                Subscription(user_id=user_id, following_id=following_id)
+                for user_id, following_id in sorted(pairs)
+                if user_id != following_id
+            ],
+        )
+
+    def create_links(self, share: float, recipe_ids: list[int]):
+        self.bulk_create(
+            Link,
+            [
+                Link(
+                    recipe_id=recipe_id,
+                    original_link=f"http://localhost/recipes/{recipe_id}/",
+                    short_code=Link.create_short_code(recipe_id),
+                )
+                for recipe_id in sorted(
+                    self.rng.sample(recipe_ids, int(len(recipe_ids) * share))
+                )
+            ],
+        )
@@ -1,25 +1,249 @@
 import csv
+import itertools
+import json
+import time
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from recipe.models import Ingredient
+from foodgram.cache import bump_version
+from recipe import counters
+from recipe.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+CSV_FIELDS = {
+    "ingredients": ("name", "measurement_unit"),
+    "tags": ("name", "slug"),
+}
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(file, fields: tuple):
+    """Строки CSV как словари. Заголовок необязателен: первая строка
+    пропускается, только если совпадает с именами полей."""
+    reader = csv.reader(file)
+    for row in reader:
+        if not row:
+            continue
+        if reader.line_num == 1 and tuple(row) == fields:
+            continue
+        yield dict(zip(fields, (value.strip() for value in row)))
+
+
+def iter_json(file):
+    """Элементы JSON-массива по одному, без чтения файла целиком.
+    Поддерживается и JSON Lines (по объекту в строке)."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer:
+            started = True
+            if buffer[0] == "[":
+                buffer = buffer[1:].lstrip()
+        if buffer[:1] in (",", "]"):
+            buffer = buffer[1:].lstrip()
+            continue
+        if buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                buffer = buffer[end:]
+                yield item
+                continue
+        if eof:
+            return
+        chunk = file.read(JSON_CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def batched(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
 
 
 class Command(BaseCommand):
-    help = "Импорт данных из csv файлов в БД."
+    help = (
+        "Импорт ингредиентов, тэгов или рецептов из CSV/JSON. "
+        "Данные читаются потоком и вставляются пачками, уже существующие "
+        "записи пропускаются, поэтому команду можно запускать повторно."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            help="Файл с данными (по умолчанию data/ingredients.csv).",
+        )
+        parser.add_argument(
+            "--model",
+            choices=("ingredients", "tags", "recipes"),
+            default="ingredients",
+        )
+        parser.add_argument(
+            "--format",
+            choices=("csv", "json"),
+            help="Формат файла (по умолчанию по расширению).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
 
     def handle(self, *args, **options):
-        self.import_ingredients()
+        model = options["model"]
+        path = Path(
+            options["path"] or settings.BASE_DIR / "data" / "ingredients.csv"
+        )
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format in ("jsonl", "ndjson"):
+            file_format = "json"
+        if file_format not in ("csv", "json"):
+            raise CommandError(f"Неизвестный формат файла: {path}")
+        if file_format == "csv" and model not in CSV_FIELDS:
+            raise CommandError("Рецепты импортируются только из JSON.")
+        if options["batch_size"] < 1:
+            raise CommandError("Размер пачки должен быть положительным.")
+        self.batch_size = options["batch_size"]
+
+        started = time.monotonic()
+        try:
+            with open(path, encoding="utf-8", newline="") as file:
+                rows = (
+                    iter_csv(file, CSV_FIELDS[model])
+                    if file_format == "csv"
+                    else iter_json(file)
+                )
+                total, created = getattr(self, f"import_{model}")(rows)
+        except OSError as error:
+            raise CommandError(f"Не удалось прочитать {path}: {error}")
+        except (ValueError, KeyError, TypeError) as error:
+            raise CommandError(f"Ошибка в данных {path}: {error!r}")
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{model}: прочитано {total}, добавлено {created}, "
+                f"{total / elapsed:.0f} строк/с"
+            )
+        )
+
+    def import_ingredients(self, rows) -> tuple[int, int]:
+        before = Ingredient.objects.count()
+        total = 0
+        for batch in batched(rows, self.batch_size):
+            total += len(batch)
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(
+                        name=row["name"],
+                        measurement_unit=row["measurement_unit"],
+                    )
+                    for row in batch
+                ],
+                ignore_conflicts=True,
+            )
+        created = Ingredient.objects.count() - before
+        if created:
+            bump_version("ingredients")
+        return total, created
 
-    def import_ingredients(self):
-        file_path = "./data/ingredients.csv"
+    def import_tags(self, rows) -> tuple[int, int]:
+        before = Tag.objects.count()
+        total = 0
+        for batch in batched(rows, self.batch_size):
+            total += len(batch)
+            Tag.objects.bulk_create(
+                [Tag(name=row["name"], slug=row["slug"]) for row in batch],
+                update_conflicts=True,
+                unique_fields=("slug",),
+                update_fields=("name",),
+            )
+        bump_version("recipes")
+        return total, Tag.objects.count() - before
 
-        with open(file_path, "r", encoding="utf-8") as csv_file:
-            reader = csv.reader(csv_file)
-            next(reader)
+    def import_recipes(self, rows) -> tuple[int, int]:
+        """Рецепты в формате, близком к API:
+        {"author": email, "name", "text", "cooking_time", "image",
+        "tags": [slug], "ingredients": [{"name", "measurement_unit",
+        "amount"}]}. Рецепт с тем же автором и названием пропускается.
+        """
+        ingredients = {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            )
+        }
+        tags = dict(Tag.objects.values_list("slug", "id"))
+        total = created = 0
+        for batch in batched(rows, self.batch_size):
+            total += len(batch)
+            with transaction.atomic():
+                created += self.create_recipes(batch, ingredients, tags)
+        if created:
+            bump_version("recipes")
+        return total, created
 
-            for row in reader:
-                ingredient = Ingredient.objects.create(
-                    name=row[0], measurement_unit=row[1]
+    def create_recipes(self, batch, ingredients, tags) -> int:
+        authors = dict(
+            User.objects.filter(
+                email__in={row["author"] for row in batch}
+            ).values_list("email", "id")
+        )
+        missing = {row["author"] for row in batch} - authors.keys()
+        if missing:
+            raise ValueError(f"Неизвестные авторы: {sorted(missing)}")
+        existing = set(
+            Recipe.objects.filter(
+                author_id__in=authors.values(),
+                name__in={row["name"] for row in batch},
+            ).values_list("author_id", "name")
+        )
+        new_rows = []
+        for row in batch:
+            key = (authors[row["author"]], row["name"])
+            if key not in existing:
+                existing.add(key)
+                new_rows.append(row)
+        recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    author_id=authors[row["author"]],
+                    name=row["name"],
+                    text=row["text"],
+                    cooking_time=row["cooking_time"],
+                    image=row.get("image"),
+                )
+                for row in new_rows
+            ]
+        )
+        counters.track_many(recipes, 1)
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredients[
+                        (item["name"], item["measurement_unit"])
+                    ],
+                    amount=item["amount"],
                 )
-                ingredient.save()
+                for recipe, row in zip(recipes, new_rows)
+                for item in row["ingredients"]
+            ]
+        )
+        RecipeTag = Recipe.tags.through
+        RecipeTag.objects.bulk_create(
+            [
+                RecipeTag(recipe_id=recipe.id, tag_id=tags[slug])
+                for recipe, row in zip(recipes, new_rows)
+                for slug in row.get("tags", ())
+            ]
+        )
+        return len(recipes)
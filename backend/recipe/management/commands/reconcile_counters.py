@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.counters import COUNTERS, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчет денормализованных счетчиков (избранное, списки покупок, "
+        "рецепты и подписки пользователей) пачками с исправлением "
+        "расхождений."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--counter",
+            action="append",
+            choices=[counter.name for counter in COUNTERS],
+            help="Пересчитать только этот счетчик (можно повторять).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("Размер пачки должен быть положительным.")
+        names = options["counter"]
+        for counter in COUNTERS:
+            if names and counter.name not in names:
+                continue
+            checked, fixed = reconcile(
+                counter, batch_size=options["batch_size"]
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{counter.name}: проверено {checked}, "
+                    f"исправлено {fixed}"
+                )
+            )
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-17 12:40
+
+from django.db import DatabaseError, migrations, transaction
+
+INDEX_NAME = "recipe_ingredient_name_trgm"
+
+
+def create_trigram_index(apps, schema_editor):
+    """Только для PostgreSQL: расширение pg_trgm и GIN-индекс по name.
+    Если прав на создание расширения нет, поиск работает по индексу
+    в памяти процесса."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    table = apps.get_model("recipe", "Ingredient")._meta.db_table
+    try:
+        with transaction.atomic():
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+                f"ON {table} USING gin (name gin_trgm_ops)"
+            )
+    except DatabaseError:
+        pass
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0012_alter_recipe_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
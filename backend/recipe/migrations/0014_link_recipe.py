@@ -0,0 +1,49 @@
+# Generated by Django 4.2.11 on 2026-10-17 13:05
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+RECIPE_PATH_RE = re.compile(r"/recipes/(\d+)/?$")
+
+
+def link_recipes(apps, schema_editor):
+    """Заполняет Link.recipe по id из original_link."""
+    Link = apps.get_model("recipe", "Link")
+    Recipe = apps.get_model("recipe", "Recipe")
+    links = []
+    for link in Link.objects.filter(recipe__isnull=True).only(
+        "id", "original_link"
+    ):
+        match = RECIPE_PATH_RE.search(link.original_link)
+        if match:
+            link.recipe_id = int(match.group(1))
+            links.append(link)
+    existing = set(Recipe.objects.values_list("id", flat=True))
+    Link.objects.bulk_update(
+        [link for link in links if link.recipe_id in existing],
+        ["recipe"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0013_ingredient_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='recipe',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='links', to='recipe.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='link',
+            name='short_code',
+            field=models.SlugField(blank=True, max_length=11, unique=True),
+        ),
+        migrations.RunPython(link_recipes, migrations.RunPython.noop),
+    ]
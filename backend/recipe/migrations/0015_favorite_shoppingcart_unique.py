@@ -0,0 +1,48 @@
+# Generated by Django 4.2.11 on 2026-10-17 13:40
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет по одной записи на (user, recipe). Версия списка
+    покупок у затронутых пользователей меняется: суммы ингредиентов
+    в скачанных списках были завышены дублями."""
+    User = apps.get_model("users", "CustomUser")
+    for name in ("Favorite", "ShoppingCart"):
+        model = apps.get_model("recipe", name)
+        duplicates = (
+            model.objects.values("user", "recipe")
+            .annotate(keep=Min("id"), total=Count("id"))
+            .filter(total__gt=1)
+        )
+        users = set()
+        for row in duplicates:
+            model.objects.filter(
+                user=row["user"], recipe=row["recipe"]
+            ).exclude(id=row["keep"]).delete()
+            users.add(row["user"])
+        if name == "ShoppingCart" and users:
+            User.objects.filter(id__in=users).update(
+                shopping_cart_version=F("shopping_cart_version") + 1
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0014_link_recipe'),
+        ('users', '0002_customuser_shopping_cart_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shoppingcart_user_recipe'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.11 on 2026-10-17 06:26
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ("recipe", "Recipe", "favorites_count", "recipe", "Favorite", "recipe"),
+    ("recipe", "Recipe", "in_carts_count", "recipe", "ShoppingCart", "recipe"),
+    ("users", "CustomUser", "recipes_count", "recipe", "Recipe", "author"),
+    (
+        "users", "CustomUser", "followers_count",
+        "users", "Subscription", "following",
+    ),
+    (
+        "users", "CustomUser", "following_count",
+        "users", "Subscription", "user",
+    ),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, name, field, relation_app, relation_name, key in COUNTERS:
+        model = apps.get_model(app, name)
+        relation = apps.get_model(relation_app, relation_name)
+        total = (
+            relation.objects.filter(**{key: OuterRef("pk")})
+            .order_by()
+            .values(key)
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        model.objects.update(
+            **{
+                field: Coalesce(
+                    Subquery(total, output_field=IntegerField()), 0
+                )
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0016_recipe_author_pub_date_idx'),
+        ('users', '0004_customuser_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,20 @@
-from random import randint
+import threading
+from contextlib import contextmanager
 from string import ascii_lowercase, ascii_uppercase, digits
 
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import F
 
 from foodgram import constants
+from foodgram.models import UpdateOnlyFieldsMixin
 
 
 User = get_user_model()
 
+_cart_versions = threading.local()
+
 
 class Ingredient(models.Model):
 
@@ -51,7 +56,9 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(UpdateOnlyFieldsMixin, models.Model):
+    update_only_fields = ("favorites_count", "in_carts_count")
+
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="recipes", db_index=True
     )
@@ -92,10 +99,27 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         verbose_name="Дата публикации", auto_now_add=True, db_index=True
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном", default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name="В списках покупок", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Recipe"
         verbose_name_plural = "Recipes"
+        indexes = [
+            # Последние рецепты автора (подписки, ROW_NUMBER по автору).
+            models.Index(
+                fields=("author", "-pub_date", "-id"),
+                name="recipe_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=("-favorites_count", "-id"),
+                name="recipe_favorites_count_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -142,6 +166,11 @@ class Favorite(FavoriteShoppingBasemodel):
         verbose_name = "Favorite"
         verbose_name_plural = "Favorites"
         default_related_name = "favorites"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_favorite_user_recipe"
+            )
+        ]
 
     def __str__(self):
         return "Избранное"
@@ -153,15 +182,70 @@ class ShoppingCart(FavoriteShoppingBasemodel):
         verbose_name = "ShoppingCart"
         verbose_name_plural = "ShoppingCart"
         default_related_name = "shopping_cart"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique_shoppingcart_user_recipe",
+            )
+        ]
 
     def __str__(self):
         return "Список покупок"
 
+    @staticmethod
+    def bump_version(**user_filters):
+        """Меняет версию списка покупок у пользователей по фильтру.
+        Вызывается при любом изменении состава списка или ингредиентов
+        входящих в него рецептов.
+        """
+        User.objects.filter(**user_filters).update(
+            shopping_cart_version=F("shopping_cart_version") + 1
+        )
+
+    @classmethod
+    def bump_recipe_versions(cls, *recipe_ids):
+        """Меняет версию у пользователей, в чьих списках есть рецепты.
+        Внутри deferred_versions() id копятся до конца блока."""
+        pending = getattr(_cart_versions, "recipe_ids", None)
+        if pending is not None:
+            pending.update(recipe_ids)
+        elif recipe_ids:
+            cls.bump_version(shopping_cart__recipe_id__in=recipe_ids)
+
+    @classmethod
+    @contextmanager
+    def deferred_versions(cls):
+        """Одно обновление версий на все рецепты, измененные в блоке.
+        Вложенные блоки присоединяются к внешнему; блок стоит держать
+        внутри transaction.atomic()."""
+        if getattr(_cart_versions, "recipe_ids", None) is not None:
+            yield
+            return
+        _cart_versions.recipe_ids = set()
+        try:
+            yield
+            recipe_ids = _cart_versions.recipe_ids
+        finally:
+            _cart_versions.recipe_ids = None
+        if recipe_ids:
+            cls.bump_version(shopping_cart__recipe_id__in=recipe_ids)
+
 
 class Link(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="links",
+        verbose_name="Рецепт",
+        null=True,
+        blank=True,
+    )
     original_link = models.URLField(blank=True)
-    short_code = models.SlugField(max_length=5, unique=True, blank=True)
-    EMAIL_RANGDOM_CHARS = ascii_lowercase + ascii_uppercase + digits
+    short_code = models.SlugField(max_length=11, unique=True, blank=True)
+    CODE_CHARS = ascii_lowercase + ascii_uppercase + digits
+    # Старые коды - случайные, не длиннее 5 символов. Новые строятся
+    # из id рецепта со смещением и всегда длиннее, поэтому не совпадают.
+    CODE_OFFSET = len(CODE_CHARS) ** 5
     __host = None
 
     class Meta:
@@ -172,16 +256,23 @@ class Link(models.Model):
         return self.short_link
 
     @classmethod
-    def create_short_code(cls):
-        length = len(cls.EMAIL_RANGDOM_CHARS) - 1
-        short_code = "".join(
-            cls.EMAIL_RANGDOM_CHARS[randint(0, length)] for _ in range(4)
-        )
-        return short_code
+    def create_short_code(cls, recipe_id: int) -> str:
+        """Код в base62 от id рецепта: уникален без проверок в БД."""
+        number = recipe_id + cls.CODE_OFFSET
+        base = len(cls.CODE_CHARS)
+        chars = []
+        while number:
+            number, index = divmod(number, base)
+            chars.append(cls.CODE_CHARS[index])
+        return "".join(reversed(chars))
 
     def save(self, *args, **kwargs):
         if not self.short_code:
-            self.short_code = self.create_short_code()
+            if self.recipe_id is None:
+                raise ValueError(
+                    "Для ссылки без рецепта нужно задать short_code."
+                )
+            self.short_code = self.create_short_code(self.recipe_id)
         super().save(*args, **kwargs)
 
     @property
@@ -0,0 +1,114 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from foodgram import variants
+from foodgram.cache import bump_version
+from recipe import counters
+from recipe.links import forget_short_code
+from recipe.models import (
+    Favorite,
+    Ingredient,
+    Link,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from users.models import CustomUser, Subscription
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, **kwargs):
+    bump_version("recipes")
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields=None, **kwargs):
+    variants.schedule_on_commit(instance.image, update_fields)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, action, **kwargs):
+    if action.startswith("post_"):
+        bump_version("recipes")
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    ShoppingCart.bump_version(shopping_cart__recipe=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    bump_version("ingredients")
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    """Название и единица измерения попадают в список покупок."""
+    if not created:
+        ShoppingCart.bump_version(
+            shopping_cart__recipe__recipeingredient__ingredient=instance
+        )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, origin=None, **kwargs):
+    # При удалении самих рецептов версию уже сменил recipe_deleted.
+    if isinstance(origin, Recipe) or getattr(origin, "model", None) is Recipe:
+        return
+    ShoppingCart.bump_recipe_versions(instance.recipe_id)
+
+
+@receiver(post_save, sender=Link)
+@receiver(post_delete, sender=Link)
+def link_changed(sender, instance, **kwargs):
+    forget_short_code(instance.short_code)
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Subscription)
+def counted_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        # Применяются в post_save: неудачное сохранение их не трогает.
+        instance._counter_moves = counters.track_moves(
+            instance, update_fields
+        )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def counted_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.track(instance, 1)
+    moves = instance.__dict__.pop("_counter_moves", None)
+    if moves:
+        counters.record(moves)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def counted_deleted(sender, instance, **kwargs):
+    counters.track(instance, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=CustomUser)
+def counter_owner_deleted(sender, instance, **kwargs):
+    counters.forget_owner(instance)
@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db import transaction
 
+from recipe import counters
 from users.models import CustomUser, Subscription
 
 admin.site.empty_value_display = "Null"
@@ -14,6 +16,9 @@ class CustomUserModel(admin.ModelAdmin):
         "last_name",
         "password",
         "avatar",
+        "recipes_count",
+        "followers_count",
+        "following_count",
     )
     list_editable = (
         "username",
@@ -24,6 +29,14 @@ class CustomUserModel(admin.ModelAdmin):
     )
     search_fields = ("username", "email")
 
+    def delete_model(self, request, obj):
+        with transaction.atomic(), counters.deferred():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic(), counters.deferred():
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(Subscription)
 class Subscription(admin.ModelAdmin):
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.11 on 2026-10-17 13:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def remove_self_follows(apps, schema_editor):
+    Subscription = apps.get_model("users", "Subscription")
+    Subscription.objects.filter(user=F("following")).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_shopping_cart_version'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='subscription',
+            name='prevent_self_follow',
+        ),
+        migrations.RunPython(remove_self_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.CheckConstraint(check=models.Q(('user', models.F('following')), _negated=True), name='prevent_self_follow'),
+        ),
+    ]
@@ -2,11 +2,18 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 from foodgram.constants import PASSWORD_MAX_LENGTH, USER_MAX_LENGTH
+from foodgram.models import UpdateOnlyFieldsMixin
 
 
-class CustomUser(AbstractUser):
+class CustomUser(UpdateOnlyFieldsMixin, AbstractUser):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
+    update_only_fields = (
+        "shopping_cart_version",
+        "recipes_count",
+        "followers_count",
+        "following_count",
+    )
     email = models.EmailField(unique=True)
     first_name = models.CharField(
         verbose_name="Имя",
@@ -23,6 +30,18 @@ class CustomUser(AbstractUser):
     avatar = models.ImageField(
         verbose_name="Аватар", upload_to="avatars", null=True, blank=True
     )
+    shopping_cart_version = models.PositiveIntegerField(
+        verbose_name="Версия списка покупок", default=0, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Рецептов", default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Подписчиков", default=0, editable=False
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name="Подписок", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "CustomUser"
@@ -54,8 +73,7 @@ class Subscription(models.Model):
                 fields=["user", "following"], name="unique_user_following"
             ),
             models.CheckConstraint(
-                check=models.Q(
-                    user=models.F("user")),
+                check=~models.Q(user=models.F("following")),
                 name="prevent_self_follow"
             ),
         ]
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_token, forget_user_tokens
+from foodgram import variants
+from foodgram.cache import bump_version
+from users.models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        bump_version("users")
+    elif update_fields is None or set(update_fields) != {"last_login"}:
+        # Пароль, is_active и профиль должны быть видны сразу.
+        forget_user_tokens(instance.pk)
+    variants.schedule_on_commit(instance.avatar, update_fields)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, **kwargs):
+    bump_version("users")
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_token(instance.key)